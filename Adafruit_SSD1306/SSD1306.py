@@ -22,8 +22,17 @@ from __future__ import division
 import logging
 import time
 
-import Adafruit_GPIO as GPIO
-import Adafruit_GPIO.SPI as SPI
+try:
+    import Adafruit_GPIO as GPIO
+    import Adafruit_GPIO.SPI as SPI
+except ImportError:
+    # Only needed to drive real hardware, displays given their own gpio
+    # and bus objects (for example Adafruit_SSD1306.virtual) work without.
+    GPIO = None
+    SPI = None
+
+# Pin mode for outputs, the value Adafruit_GPIO uses for OUT.
+_GPIO_OUT = GPIO.OUT if GPIO is not None else 0
 
 
 # Constants
@@ -63,6 +72,24 @@ SSD1306_LEFT_HORIZONTAL_SCROLL = 0x27
 SSD1306_VERTICAL_AND_RIGHT_HORIZONTAL_SCROLL = 0x29
 SSD1306_VERTICAL_AND_LEFT_HORIZONTAL_SCROLL = 0x2A
 
+# Scroll step intervals in frames and their command codes.
+SSD1306_SCROLL_FRAMES = {5: 0x0, 64: 0x1, 128: 0x2, 256: 0x3,
+                         3: 0x4, 4: 0x5, 25: 0x6, 2: 0x7}
+
+# Rows of display RAM (GDDRAM), whatever the size of the panel.
+SSD1306_GDDRAM_ROWS = 64
+
+# Table to reverse the bit order of a byte, used to turn PIL's MSB first
+# packed rows into the LSB-at-top column bytes of the display pages.
+_REVERSE_BITS = bytes(bytearray(int('{0:08b}'.format(i)[::-1], 2) for i in range(256)))
+
+# Largest block an SMBus I2C adapter can write in one transaction.
+SSD1306_I2C_BLOCK_MAX = 32
+
+# Bytes worth of addressing commands sent for each extra window by
+# display(), used to decide when neighbouring dirty pages are merged.
+_WINDOW_COST = 6
+
 
 class SSD1306Base(object):
     """Base class for SSD1306-based OLED displays.  Implementors should subclass
@@ -71,22 +98,51 @@ class SSD1306Base(object):
 
     def __init__(self, width, height, rst, dc=None, sclk=None, din=None, cs=None,
                  gpio=None, spi=None, i2c_bus=None, i2c_address=SSD1306_I2C_ADDRESS,
-                 i2c=None):
+                 i2c=None, chunk_size=16):
         self._log = logging.getLogger('Adafruit_SSD1306.SSD1306Base')
+        # Number of data bytes sent per I2C write.  SMBus adapters are
+        # limited to SSD1306_I2C_BLOCK_MAX, plain I2C adapters may allow
+        # larger blocks.
+        if chunk_size < 1:
+            raise ValueError('Chunk size must be at least 1.')
+        self._chunk_size = chunk_size
         self._spi = None
         self._i2c = None
         self.width = width
         self.height = height
         self._pages = height//8
-        self._buffer = [0]*(width*self._pages)
-        # Default to platform GPIO if not provided.
+        # The frame buffer is allocated once and only ever changed in place,
+        # writes hand out memoryview slices of it rather than copies.
+        self._buffer = bytearray(width*self._pages)
+        self._view = memoryview(self._buffer)
+        self._blank = bytes(self._buffer)
+        # Copy of the buffer last written to the display, only valid when
+        # _sent_valid is set; otherwise the display contents are unknown
+        # and the next write must be full.
+        self._sent = bytearray(width*self._pages)
+        self._sent_view = memoryview(self._sent)
+        self._sent_valid = False
+        # Screen of display RAM shown and written by display(), and the
+        # contents of each screen written by load_screens().
+        self._screen = 0
+        self._screens = None
+        # Set while the controller is scrolling, display RAM must not be
+        # written then.
+        self._scrolling = False
+        # Fraction of the buffer above which display() sends a full frame
+        # instead of the changed windows.
+        self.full_refresh_ratio = 0.5
+        # Default to platform GPIO if not provided and a pin is used.
         self._gpio = gpio
-        if self._gpio is None:
+        if self._gpio is None and (rst is not None or dc is not None or
+                                   spi is not None or sclk is not None):
+            if GPIO is None:
+                raise ImportError('Adafruit_GPIO is required to drive GPIO pins.')
             self._gpio = GPIO.get_platform_gpio()
         # Setup reset pin.
         self._rst = rst
         if not self._rst is None:
-            self._gpio.setup(self._rst, GPIO.OUT)
+            self._gpio.setup(self._rst, _GPIO_OUT)
         # Handle hardware SPI
         if spi is not None:
             self._log.debug('Using hardware SPI')
@@ -95,6 +151,8 @@ class SSD1306Base(object):
         # Handle software SPI
         elif sclk is not None and din is not None and cs is not None:
             self._log.debug('Using software SPI')
+            if SPI is None:
+                raise ImportError('Adafruit_GPIO is required for software SPI.')
             self._spi = SPI.BitBang(self._gpio, sclk, din, None, cs)
         # Handle hardware I2C
         elif i2c is not None:
@@ -112,7 +170,7 @@ class SSD1306Base(object):
             if dc is None:
                 raise ValueError('DC pin must be provided when using SPI.')
             self._dc = dc
-            self._gpio.setup(self._dc, GPIO.OUT)
+            self._gpio.setup(self._dc, _GPIO_OUT)
 
     def _initialize(self):
         raise NotImplementedError
@@ -128,6 +186,21 @@ class SSD1306Base(object):
             control = 0x00   # Co = 0, DC = 0
             self._i2c.write8(control, c)
 
+    def commands(self, seq):
+        """Send a sequence of command bytes to display in as few writes as
+        possible: a single SPI write, or I2C block writes of up to
+        SSD1306_I2C_BLOCK_MAX bytes.
+        """
+        if self._spi is not None:
+            # SPI write.
+            self._gpio.set_low(self._dc)
+            self._spi.write(seq)
+        else:
+            # I2C write.
+            control = 0x00   # Co = 0, DC = 0
+            for i in range(0, len(seq), SSD1306_I2C_BLOCK_MAX):
+                self._i2c.writeList(control, seq[i:i+SSD1306_I2C_BLOCK_MAX])
+
     def data(self, c):
         """Send byte of data to display."""
         if self._spi is not None:
@@ -151,6 +224,9 @@ class SSD1306Base(object):
 
     def reset(self):
         """Reset the display."""
+        self.invalidate()
+        # Initialization shows the first screen again.
+        self._screen = 0
         if self._rst is None:
             return
         # Set reset high for a millisecond.
@@ -163,23 +239,115 @@ class SSD1306Base(object):
         self._gpio.set_high(self._rst)
 
     def display(self):
-        """Write display buffer to physical display."""
-        self.command(SSD1306_COLUMNADDR)
-        self.command(0)              # Column start address. (0 = reset)
-        self.command(self.width-1)   # Column end address.
-        self.command(SSD1306_PAGEADDR)
-        self.command(0)              # Page start address. (0 = reset)
-        self.command(self._pages-1)  # Page end address.
-        # Write buffer data.
+        """Write display buffer to physical display.  Only the windows of
+        pages and columns that changed since the previous call are sent,
+        unless most of the buffer changed or the display contents are not
+        known (see invalidate).  After show_screen() the buffer goes to the
+        screen shown.  An active hardware scroll is stopped first.
+        """
+        if self._scrolling:
+            self.stop_scroll()
+        windows = self._dirty_windows()
+        if windows is None:
+            self._write_window(0, self.width-1, 0, self._pages-1)
+        else:
+            for window in windows:
+                self._write_window(*window)
+        self._sent[:] = self._buffer
+        self._sent_valid = True
+        if self._screens is not None:
+            self._screens[self._screen] = bytearray(self._buffer)
+
+    def invalidate(self):
+        """Forget what is on the display so the next display() call
+        writes the full buffer.
+        """
+        self._sent_valid = False
+
+    def _dirty_windows(self):
+        """Return a list of (col_start, col_end, page_start, page_end)
+        windows covering every byte that differs from the last frame sent,
+        or None if a full frame should be written instead.
+        """
+        if not self._sent_valid:
+            return None
+        width = self.width
+        buf = self._buffer
+        sent = self._sent
+        view = self._view
+        sent_view = self._sent_view
+        windows = []
+        total = 0
+        for page in range(self._pages):
+            start = page*width
+            end = start + width
+            if view[start:end] == sent_view[start:end]:
+                continue
+            first = start
+            while buf[first] == sent[first]:
+                first += 1
+            last = end - 1
+            while buf[last] == sent[last]:
+                last -= 1
+            first -= start
+            last -= start
+            if windows:
+                # Merge with the window of the page above if sending the
+                # extra unchanged bytes is cheaper than a new window.
+                c0, c1, p0, p1 = windows[-1]
+                if p1 == page-1:
+                    m0 = min(c0, first)
+                    m1 = max(c1, last)
+                    merged = (m1-m0+1)*(page-p0+1)
+                    separate = (c1-c0+1)*(p1-p0+1) + (last-first+1) + _WINDOW_COST
+                    if merged <= separate:
+                        total += merged - (c1-c0+1)*(p1-p0+1)
+                        windows[-1] = (m0, m1, p0, page)
+                        continue
+            total += last-first+1
+            windows.append((first, last, page, page))
+        if total > len(buf)*self.full_refresh_ratio:
+            return None
+        return windows
+
+    def _write_window(self, col_start, col_end, page_start, page_end):
+        """Write the buffer bytes of a window of columns and pages to the
+        screen shown.
+        """
+        offset = self._screen*self._pages
+        self.commands([
+            SSD1306_COLUMNADDR,
+            col_start,               # Column start address. (0 = reset)
+            col_end,                 # Column end address.
+            SSD1306_PAGEADDR,
+            offset + page_start,     # Page start address. (0 = reset)
+            offset + page_end,       # Page end address.
+        ])
+        if col_start == 0 and col_end == self.width-1 or page_start == page_end:
+            # The window is one contiguous run of the buffer.
+            start = page_start*self.width + col_start
+            end = page_end*self.width + col_end + 1
+            data = self._view[start:end]
+        else:
+            data = bytearray()
+            for page in range(page_start, page_end+1):
+                offset = page*self.width
+                data += self._view[offset+col_start:offset+col_end+1]
+            data = memoryview(data)
+        self._write_data(data)
+
+    def _write_data(self, data):
+        """Send display data bytes in the configured chunk size."""
         if self._spi is not None:
             # Set DC high for data.
             self._gpio.set_high(self._dc)
             # Write buffer.
-            self._spi.write(self._buffer)
+            self._spi.write(data)
         else:
-            for i in range(0, len(self._buffer), 16):
+            chunk_size = self._chunk_size
+            for i in range(0, len(data), chunk_size):
                 control = 0x40   # Co = 0, DC = 0
-                self._i2c.writeList(control, self._buffer[i:i+16])
+                self._i2c.writeList(control, data[i:i+chunk_size])
 
     def image(self, image):
         """Set buffer to value of Python Imaging Library image.  The image should
@@ -191,6 +359,12 @@ class SSD1306Base(object):
         if imwidth > self.width or imheight > self.height:
             raise ValueError('Image must fit width({0}), height({1}) dimensions but is ({2}x{3}).' \
                 .format(self.width, self.height, imwidth, imheight))
+        if imwidth == self.width and imheight == self.height:
+            packed = self._pack_image(image)
+            if packed is not None:
+                self._buffer[:] = packed
+                return
+        # Fall back to setting each bit from the individual pixels.
         # Grab all the pixels from the image, faster than getpixel.
         pix = image.load()
         # Iterate through the memory pages
@@ -208,17 +382,157 @@ class SSD1306Base(object):
                 self._buffer[index] = bits
                 index += 1
 
+    def _pack_image(self, image):
+        """Return the display buffer for a full size mode 1 image as
+        bytes, or None if the image does not support the fast path.
+        """
+        try:
+            from PIL import Image
+            transpose = getattr(Image, 'Transpose', Image).TRANSPOSE
+            # Transposing turns every column of the image into a row, which
+            # PIL packs into bytes MSB first.  Byte p of row x then holds
+            # the pixels of column x on page p with the top pixel in the
+            # MSB, so it only needs its bits reversed and to be regrouped
+            # page by page.
+            data = image.transpose(transpose).tobytes()
+        except (ImportError, AttributeError):
+            return None
+        pages = self._pages
+        packed = b''.join(data[page::pages] for page in range(pages))
+        return packed.translate(_REVERSE_BITS)
+
     def clear(self):
         """Clear contents of image buffer."""
-        self._buffer = [0]*(self.width*self._pages)
+        self._buffer[:] = self._blank
+
+    def set_pixel(self, x, y, on=True):
+        """Set (or clear) a single pixel of the buffer, pixels outside the
+        display are ignored.
+        """
+        if 0 <= x < self.width and 0 <= y < self.height:
+            index = (y >> 3)*self.width + x
+            if on:
+                self._buffer[index] |= 1 << (y & 7)
+            else:
+                self._buffer[index] &= ~(1 << (y & 7)) & 0xFF
+
+    def _clip(self, x, y, w, h):
+        """Clip a rectangle to the display, returns (x0, y0, x1, y1) with
+        exclusive ends, or None if nothing is left of it.
+        """
+        x0 = max(x, 0)
+        y0 = max(y, 0)
+        x1 = min(x + w, self.width)
+        y1 = min(y + h, self.height)
+        if x0 >= x1 or y0 >= y1:
+            return None
+        return x0, y0, x1, y1
+
+    def _page_masks(self, y0, y1):
+        """Yield (page, mask) for the pages rows y0 to y1-1 touch, the mask
+        selecting the bits of those rows within the page.
+        """
+        for page in range(y0 >> 3, ((y1 - 1) >> 3) + 1):
+            top = max(y0 - page*8, 0)
+            bottom = min(y1 - page*8, 8)
+            yield page, ((0xFF << top) & 0xFF) & (0xFF >> (8 - bottom))
+
+    def fill_rect(self, x, y, w, h, on=True):
+        """Set (or clear) every pixel of a rectangle."""
+        clip = self._clip(x, y, w, h)
+        if clip is None:
+            return
+        x0, y0, x1, y1 = clip
+        buf = self._buffer
+        for page, mask in self._page_masks(y0, y1):
+            start = page*self.width
+            if mask == 0xFF:
+                buf[start+x0:start+x1] = (b'\xff' if on else b'\x00')*(x1-x0)
+            elif on:
+                for i in range(start+x0, start+x1):
+                    buf[i] |= mask
+            else:
+                keep = ~mask & 0xFF
+                for i in range(start+x0, start+x1):
+                    buf[i] &= keep
+
+    def hline(self, x, y, w, on=True):
+        """Draw a horizontal line w pixels long starting at x, y."""
+        self.fill_rect(x, y, w, 1, on)
+
+    def vline(self, x, y, h, on=True):
+        """Draw a vertical line h pixels long starting at x, y."""
+        self.fill_rect(x, y, 1, h, on)
+
+    def rect(self, x, y, w, h, on=True, fill=False):
+        """Draw the outline of a rectangle, or fill it if fill is True."""
+        if w <= 0 or h <= 0:
+            return
+        if fill:
+            self.fill_rect(x, y, w, h, on)
+            return
+        self.hline(x, y, w, on)
+        self.hline(x, y + h - 1, w, on)
+        self.vline(x, y, h, on)
+        self.vline(x + w - 1, y, h, on)
+
+    def blit(self, data, x, y, w, h):
+        """Copy a w x h bitmap into the buffer with its top left corner at
+        x, y.  The bitmap is in the display's own layout: (h+7)//8 pages
+        of w column bytes each, least significant bit at the top.  Pixels
+        of the area are replaced, not combined.
+        """
+        clip = self._clip(x, y, w, h)
+        if clip is None:
+            return
+        x0, y0, x1, y1 = clip
+        src_pages = (h + 7) // 8
+        area = ((1 << (y1 - y0)) - 1) << (y0 & 7)
+        first_page = y0 >> 3
+        pages = list(range(first_page, ((y1 - 1) >> 3) + 1))
+        # Shift from the bitmap rows to the rows of the first page touched.
+        shift = y - first_page*8
+        buf = self._buffer
+        for dx in range(x0, x1):
+            sx = dx - x
+            column = 0
+            for page in range(src_pages):
+                column |= data[page*w + sx] << (page*8)
+            column = (column << shift) if shift >= 0 else (column >> -shift)
+            for n, page in enumerate(pages):
+                mask = (area >> (n*8)) & 0xFF
+                index = page*self.width + dx
+                bits = (column >> (n*8)) & mask
+                buf[index] = (buf[index] & ~mask & 0xFF) | bits
+
+    def scroll_left(self, x, y, w, h, n=1):
+        """Move the pixels of a rectangle n columns to the left within it,
+        the columns freed on the right are cleared.
+        """
+        clip = self._clip(x, y, w, h)
+        if clip is None:
+            return
+        x0, y0, x1, y1 = clip
+        n = min(n, x1 - x0)
+        buf = self._buffer
+        for page, mask in self._page_masks(y0, y1):
+            start = page*self.width
+            if mask == 0xFF:
+                buf[start+x0:start+x1-n] = buf[start+x0+n:start+x1]
+                buf[start+x1-n:start+x1] = b'\x00'*n
+            else:
+                keep = ~mask & 0xFF
+                for i in range(start+x0, start+x1-n):
+                    buf[i] = (buf[i] & keep) | (buf[i+n] & mask)
+                for i in range(start+x1-n, start+x1):
+                    buf[i] &= keep
 
     def set_contrast(self, contrast):
         """Sets the contrast of the display.  Contrast should be a value between
         0 and 255."""
         if contrast < 0 or contrast > 255:
             raise ValueError('Contrast must be a value from 0 to 255 (inclusive).')
-        self.command(SSD1306_SETCONTRAST)
-        self.command(contrast)
+        self.commands([SSD1306_SETCONTRAST, contrast])
 
     def dim(self, dim):
         """Adjusts contrast to dim the display if dim is True, otherwise sets the
@@ -234,130 +548,258 @@ class SSD1306Base(object):
                 contrast = 0xCF
             self.set_contrast(contrast)
 
+    def _scroll_frames(self, frames):
+        if frames not in SSD1306_SCROLL_FRAMES:
+            raise ValueError('Scroll interval must be one of {0} frames.'
+                .format(sorted(SSD1306_SCROLL_FRAMES)))
+        return SSD1306_SCROLL_FRAMES[frames]
+
+    def _scroll_pages(self, start_page, end_page):
+        if end_page is None:
+            end_page = self._pages-1
+        if not 0 <= start_page <= end_page <= 7:
+            raise ValueError('Scroll pages must satisfy 0 <= start <= end <= 7.')
+        return start_page, end_page
+
+    def start_scroll_horizontal(self, left=False, start_page=0, end_page=None,
+                                frames=5):
+        """Continuously scroll pages start_page to end_page (default all)
+        one column right, or left, every frames display frames.  The
+        controller runs the scroll on its own, nothing is sent while it
+        moves.
+        """
+        start_page, end_page = self._scroll_pages(start_page, end_page)
+        direction = SSD1306_LEFT_HORIZONTAL_SCROLL if left else SSD1306_RIGHT_HORIZONTAL_SCROLL
+        self.commands([
+            SSD1306_DEACTIVATE_SCROLL,
+            direction,
+            0x00,                    # Dummy byte.
+            start_page,
+            self._scroll_frames(frames),
+            end_page,
+            0x00,                    # Dummy bytes.
+            0xFF,
+            SSD1306_ACTIVATE_SCROLL,
+        ])
+        self._scrolling = True
+
+    def set_vertical_scroll_area(self, fixed_rows=0, scroll_rows=None):
+        """Keep fixed_rows rows at the top of the panel still and scroll the
+        scroll_rows rows below them (default the rest of the panel) when a
+        diagonal scroll is running.
+        """
+        if scroll_rows is None:
+            scroll_rows = self.height - fixed_rows
+        if fixed_rows < 0 or scroll_rows < 0 or fixed_rows + scroll_rows > self.height:
+            raise ValueError('Scroll area must fit the display height({0}).'.format(self.height))
+        self.commands([SSD1306_SET_VERTICAL_SCROLL_AREA, fixed_rows, scroll_rows])
+
+    def start_scroll_diagonal(self, left=False, start_page=0, end_page=None,
+                              frames=5, vertical_offset=1):
+        """Continuously scroll the vertical scroll area up by
+        vertical_offset rows, and pages start_page to end_page one column
+        right (or left), every frames display frames.
+        """
+        start_page, end_page = self._scroll_pages(start_page, end_page)
+        if not 0 <= vertical_offset < SSD1306_GDDRAM_ROWS:
+            raise ValueError('Vertical offset must be a value from 0 to 63.')
+        if left:
+            direction = SSD1306_VERTICAL_AND_LEFT_HORIZONTAL_SCROLL
+        else:
+            direction = SSD1306_VERTICAL_AND_RIGHT_HORIZONTAL_SCROLL
+        self.commands([
+            SSD1306_DEACTIVATE_SCROLL,
+            direction,
+            0x00,                    # Dummy byte.
+            start_page,
+            self._scroll_frames(frames),
+            end_page,
+            vertical_offset,
+            SSD1306_ACTIVATE_SCROLL,
+        ])
+        self._scrolling = True
+
+    def stop_scroll(self):
+        """Stop any hardware scroll.  Scrolling moves the contents of display
+        RAM, so the next display() call rewrites the full buffer.
+        """
+        self.command(SSD1306_DEACTIVATE_SCROLL)
+        self._scrolling = False
+        self.invalidate()
+
+    def set_start_line(self, line):
+        """Show display RAM from row line at the top of the panel, rows
+        wrap around after the last of the 64 RAM rows.
+        """
+        if not 0 <= line < SSD1306_GDDRAM_ROWS:
+            raise ValueError('Start line must be a value from 0 to 63.')
+        self.command(SSD1306_SETSTARTLINE | line)
+
+    def screens(self):
+        """Number of full screens display RAM holds for this panel."""
+        return SSD1306_GDDRAM_ROWS // self.height
+
+    def load_screens(self, buffers):
+        """Write up to screens() frames into display RAM at once so they
+        can be shown in turn with show_screen(), at the cost of one
+        command byte per change and no data transfer.  Each frame is a
+        buffer in the same page layout as the display buffer, for example
+        a copy taken after image().  The first frame is shown and the
+        display buffer ends up holding it.
+        """
+        if not 0 < len(buffers) <= self.screens():
+            raise ValueError('Display RAM holds 1 to {0} screens.'.format(self.screens()))
+        size = len(self._buffer)
+        data = bytearray()
+        for buf in buffers:
+            if len(buf) != size:
+                raise ValueError('Screen buffers must be {0} bytes.'.format(size))
+            data += buf
+        if self._scrolling:
+            self.stop_scroll()
+        pages = len(buffers)*self._pages
+        self.commands([
+            SSD1306_COLUMNADDR, 0, self.width-1,
+            SSD1306_PAGEADDR, 0, pages-1,
+        ])
+        self._write_data(memoryview(data))
+        self._screens = [bytearray(buf) for buf in buffers]
+        self._screens += [None]*(self.screens() - len(buffers))
+        self._screen = None
+        self.show_screen(0)
+
+    def show_screen(self, index):
+        """Show a screen written by load_screens().  The display buffer
+        then holds that screen and display() writes to it, so drawing and
+        display() change the screen shown.  A screen load_screens() did
+        not write is of unknown contents, the next display() writes it in
+        full.
+        """
+        if not 0 <= index < self.screens():
+            raise ValueError('Screen must be a value from 0 to {0}.'.format(self.screens()-1))
+        if index == self._screen:
+            return
+        self.set_start_line(index*self.height)
+        self._screen = index
+        if self._screens is not None and self._screens[index] is not None:
+            self._buffer[:] = self._screens[index]
+            self._sent[:] = self._buffer
+            self._sent_valid = True
+        else:
+            self.invalidate()
+
 class SSD1306_128_64(SSD1306Base):
     def __init__(self, rst, dc=None, sclk=None, din=None, cs=None, gpio=None,
                  spi=None, i2c_bus=None, i2c_address=SSD1306_I2C_ADDRESS,
-                 i2c=None):
+                 i2c=None, chunk_size=16):
         # Call base class constructor.
         super(SSD1306_128_64, self).__init__(128, 64, rst, dc, sclk, din, cs,
-                                             gpio, spi, i2c_bus, i2c_address, i2c)
+                                             gpio, spi, i2c_bus, i2c_address, i2c,
+                                             chunk_size)
 
     def _initialize(self):
         # 128x64 pixel specific initialization.
-        self.command(SSD1306_DISPLAYOFF)                    # 0xAE
-        self.command(SSD1306_SETDISPLAYCLOCKDIV)            # 0xD5
-        self.command(0x80)                                  # the suggested ratio 0x80
-        self.command(SSD1306_SETMULTIPLEX)                  # 0xA8
-        self.command(0x3F)
-        self.command(SSD1306_SETDISPLAYOFFSET)              # 0xD3
-        self.command(0x0)                                   # no offset
-        self.command(SSD1306_SETSTARTLINE | 0x0)            # line #0
-        self.command(SSD1306_CHARGEPUMP)                    # 0x8D
-        if self._vccstate == SSD1306_EXTERNALVCC:
-            self.command(0x10)
-        else:
-            self.command(0x14)
-        self.command(SSD1306_MEMORYMODE)                    # 0x20
-        self.command(0x00)                                  # 0x0 act like ks0108
-        self.command(SSD1306_SEGREMAP | 0x1)
-        self.command(SSD1306_COMSCANDEC)
-        self.command(SSD1306_SETCOMPINS)                    # 0xDA
-        self.command(0x12)
-        self.command(SSD1306_SETCONTRAST)                   # 0x81
-        if self._vccstate == SSD1306_EXTERNALVCC:
-            self.command(0x9F)
-        else:
-            self.command(0xCF)
-        self.command(SSD1306_SETPRECHARGE)                  # 0xd9
-        if self._vccstate == SSD1306_EXTERNALVCC:
-            self.command(0x22)
-        else:
-            self.command(0xF1)
-        self.command(SSD1306_SETVCOMDETECT)                 # 0xDB
-        self.command(0x40)
-        self.command(SSD1306_DISPLAYALLON_RESUME)           # 0xA4
-        self.command(SSD1306_NORMALDISPLAY)                 # 0xA6
+        self.commands([
+            SSD1306_DISPLAYOFF,                                 # 0xAE
+            SSD1306_SETDISPLAYCLOCKDIV,                         # 0xD5
+            0x80,                                               # the suggested ratio 0x80
+            SSD1306_SETMULTIPLEX,                               # 0xA8
+            0x3F,
+            SSD1306_SETDISPLAYOFFSET,                           # 0xD3
+            0x0,                                                # no offset
+            SSD1306_SETSTARTLINE | 0x0,                         # line #0
+            SSD1306_CHARGEPUMP,                                 # 0x8D
+            0x10 if self._vccstate == SSD1306_EXTERNALVCC else 0x14,
+            SSD1306_MEMORYMODE,                                 # 0x20
+            0x00,                                               # 0x0 act like ks0108
+            SSD1306_SEGREMAP | 0x1,
+            SSD1306_COMSCANDEC,
+            SSD1306_SETCOMPINS,                                 # 0xDA
+            0x12,
+            SSD1306_SETCONTRAST,                                # 0x81
+            0x9F if self._vccstate == SSD1306_EXTERNALVCC else 0xCF,
+            SSD1306_SETPRECHARGE,                               # 0xd9
+            0x22 if self._vccstate == SSD1306_EXTERNALVCC else 0xF1,
+            SSD1306_SETVCOMDETECT,                              # 0xDB
+            0x40,
+            SSD1306_DISPLAYALLON_RESUME,                        # 0xA4
+            SSD1306_NORMALDISPLAY,                              # 0xA6
+        ])
 
 
 class SSD1306_128_32(SSD1306Base):
     def __init__(self, rst, dc=None, sclk=None, din=None, cs=None, gpio=None,
                  spi=None, i2c_bus=None, i2c_address=SSD1306_I2C_ADDRESS,
-                 i2c=None):
+                 i2c=None, chunk_size=16):
         # Call base class constructor.
         super(SSD1306_128_32, self).__init__(128, 32, rst, dc, sclk, din, cs,
-                                             gpio, spi, i2c_bus, i2c_address, i2c)
+                                             gpio, spi, i2c_bus, i2c_address, i2c,
+                                             chunk_size)
 
     def _initialize(self):
         # 128x32 pixel specific initialization.
-        self.command(SSD1306_DISPLAYOFF)                    # 0xAE
-        self.command(SSD1306_SETDISPLAYCLOCKDIV)            # 0xD5
-        self.command(0x80)                                  # the suggested ratio 0x80
-        self.command(SSD1306_SETMULTIPLEX)                  # 0xA8
-        self.command(0x1F)
-        self.command(SSD1306_SETDISPLAYOFFSET)              # 0xD3
-        self.command(0x0)                                   # no offset
-        self.command(SSD1306_SETSTARTLINE | 0x0)            # line #0
-        self.command(SSD1306_CHARGEPUMP)                    # 0x8D
-        if self._vccstate == SSD1306_EXTERNALVCC:
-            self.command(0x10)
-        else:
-            self.command(0x14)
-        self.command(SSD1306_MEMORYMODE)                    # 0x20
-        self.command(0x00)                                  # 0x0 act like ks0108
-        self.command(SSD1306_SEGREMAP | 0x1)
-        self.command(SSD1306_COMSCANDEC)
-        self.command(SSD1306_SETCOMPINS)                    # 0xDA
-        self.command(0x02)
-        self.command(SSD1306_SETCONTRAST)                   # 0x81
-        self.command(0x8F)
-        self.command(SSD1306_SETPRECHARGE)                  # 0xd9
-        if self._vccstate == SSD1306_EXTERNALVCC:
-            self.command(0x22)
-        else:
-            self.command(0xF1)
-        self.command(SSD1306_SETVCOMDETECT)                 # 0xDB
-        self.command(0x40)
-        self.command(SSD1306_DISPLAYALLON_RESUME)           # 0xA4
-        self.command(SSD1306_NORMALDISPLAY)                 # 0xA6
+        self.commands([
+            SSD1306_DISPLAYOFF,                                 # 0xAE
+            SSD1306_SETDISPLAYCLOCKDIV,                         # 0xD5
+            0x80,                                               # the suggested ratio 0x80
+            SSD1306_SETMULTIPLEX,                               # 0xA8
+            0x1F,
+            SSD1306_SETDISPLAYOFFSET,                           # 0xD3
+            0x0,                                                # no offset
+            SSD1306_SETSTARTLINE | 0x0,                         # line #0
+            SSD1306_CHARGEPUMP,                                 # 0x8D
+            0x10 if self._vccstate == SSD1306_EXTERNALVCC else 0x14,
+            SSD1306_MEMORYMODE,                                 # 0x20
+            0x00,                                               # 0x0 act like ks0108
+            SSD1306_SEGREMAP | 0x1,
+            SSD1306_COMSCANDEC,
+            SSD1306_SETCOMPINS,                                 # 0xDA
+            0x02,
+            SSD1306_SETCONTRAST,                                # 0x81
+            0x8F,
+            SSD1306_SETPRECHARGE,                               # 0xd9
+            0x22 if self._vccstate == SSD1306_EXTERNALVCC else 0xF1,
+            SSD1306_SETVCOMDETECT,                              # 0xDB
+            0x40,
+            SSD1306_DISPLAYALLON_RESUME,                        # 0xA4
+            SSD1306_NORMALDISPLAY,                              # 0xA6
+        ])
 
 
 class SSD1306_96_16(SSD1306Base):
     def __init__(self, rst, dc=None, sclk=None, din=None, cs=None, gpio=None,
                  spi=None, i2c_bus=None, i2c_address=SSD1306_I2C_ADDRESS,
-                 i2c=None):
+                 i2c=None, chunk_size=16):
         # Call base class constructor.
         super(SSD1306_96_16, self).__init__(96, 16, rst, dc, sclk, din, cs,
-                                            gpio, spi, i2c_bus, i2c_address, i2c)
+                                            gpio, spi, i2c_bus, i2c_address, i2c,
+                                            chunk_size)
 
     def _initialize(self):
         # 128x32 pixel specific initialization.
-        self.command(SSD1306_DISPLAYOFF)                    # 0xAE
-        self.command(SSD1306_SETDISPLAYCLOCKDIV)            # 0xD5
-        self.command(0x60)                                  # the suggested ratio 0x60
-        self.command(SSD1306_SETMULTIPLEX)                  # 0xA8
-        self.command(0x0F)
-        self.command(SSD1306_SETDISPLAYOFFSET)              # 0xD3
-        self.command(0x0)                                   # no offset
-        self.command(SSD1306_SETSTARTLINE | 0x0)            # line #0
-        self.command(SSD1306_CHARGEPUMP)                    # 0x8D
-        if self._vccstate == SSD1306_EXTERNALVCC:
-            self.command(0x10)
-        else:
-            self.command(0x14)
-        self.command(SSD1306_MEMORYMODE)                    # 0x20
-        self.command(0x00)                                  # 0x0 act like ks0108
-        self.command(SSD1306_SEGREMAP | 0x1)
-        self.command(SSD1306_COMSCANDEC)
-        self.command(SSD1306_SETCOMPINS)                    # 0xDA
-        self.command(0x02)
-        self.command(SSD1306_SETCONTRAST)                   # 0x81
-        self.command(0x8F)
-        self.command(SSD1306_SETPRECHARGE)                  # 0xd9
-        if self._vccstate == SSD1306_EXTERNALVCC:
-            self.command(0x22)
-        else:
-            self.command(0xF1)
-        self.command(SSD1306_SETVCOMDETECT)                 # 0xDB
-        self.command(0x40)
-        self.command(SSD1306_DISPLAYALLON_RESUME)           # 0xA4
-        self.command(SSD1306_NORMALDISPLAY)                 # 0xA6
+        self.commands([
+            SSD1306_DISPLAYOFF,                                 # 0xAE
+            SSD1306_SETDISPLAYCLOCKDIV,                         # 0xD5
+            0x60,                                               # the suggested ratio 0x60
+            SSD1306_SETMULTIPLEX,                               # 0xA8
+            0x0F,
+            SSD1306_SETDISPLAYOFFSET,                           # 0xD3
+            0x0,                                                # no offset
+            SSD1306_SETSTARTLINE | 0x0,                         # line #0
+            SSD1306_CHARGEPUMP,                                 # 0x8D
+            0x10 if self._vccstate == SSD1306_EXTERNALVCC else 0x14,
+            SSD1306_MEMORYMODE,                                 # 0x20
+            0x00,                                               # 0x0 act like ks0108
+            SSD1306_SEGREMAP | 0x1,
+            SSD1306_COMSCANDEC,
+            SSD1306_SETCOMPINS,                                 # 0xDA
+            0x02,
+            SSD1306_SETCONTRAST,                                # 0x81
+            0x8F,
+            SSD1306_SETPRECHARGE,                               # 0xd9
+            0x22 if self._vccstate == SSD1306_EXTERNALVCC else 0xF1,
+            SSD1306_SETVCOMDETECT,                              # 0xDB
+            0x40,
+            SSD1306_DISPLAYALLON_RESUME,                        # 0xA4
+            SSD1306_NORMALDISPLAY,                              # 0xA6
+        ])
@@ -0,0 +1,370 @@
+"""In-memory SSD1306 controller for running the display code off the Pi.
+
+VirtualSSD1306 stands in for both the I2C device and the SPI bus (plus
+the GPIO pins driving DC and reset) of a real panel.  It decodes the
+command stream into an emulated display RAM (GDDRAM) the way the
+controller does, so the result of image()/display() can be dumped as a
+PNG or PBM file, and it counts the bytes and transactions sent to it,
+which is the real bus cost of a change to the drawing code.
+
+    disp, device = virtual_display(SSD1306_128_64)
+    disp.begin()
+    disp.image(image)
+    disp.display()
+    device.save_png('frame.png', scale=4)
+    print(device.stats())
+"""
+from __future__ import division
+import struct
+import zlib
+
+from .SSD1306 import *
+
+
+# Size of display RAM, whatever the size of the panel.
+GDDRAM_COLUMNS = 128
+GDDRAM_PAGES = 8
+
+# Memory addressing modes set with SSD1306_MEMORYMODE.
+MEMORY_HORIZONTAL = 0
+MEMORY_VERTICAL = 1
+MEMORY_PAGE = 2
+
+# Number of parameter bytes following each multi-byte command.
+_PARAMETERS = {
+    SSD1306_SETCONTRAST: 1,
+    SSD1306_MEMORYMODE: 1,
+    SSD1306_COLUMNADDR: 2,
+    SSD1306_PAGEADDR: 2,
+    SSD1306_SETMULTIPLEX: 1,
+    SSD1306_SETDISPLAYOFFSET: 1,
+    SSD1306_SETDISPLAYCLOCKDIV: 1,
+    SSD1306_SETPRECHARGE: 1,
+    SSD1306_SETCOMPINS: 1,
+    SSD1306_SETVCOMDETECT: 1,
+    SSD1306_CHARGEPUMP: 1,
+    SSD1306_SET_VERTICAL_SCROLL_AREA: 2,
+    SSD1306_RIGHT_HORIZONTAL_SCROLL: 6,
+    SSD1306_LEFT_HORIZONTAL_SCROLL: 6,
+    SSD1306_VERTICAL_AND_RIGHT_HORIZONTAL_SCROLL: 5,
+    SSD1306_VERTICAL_AND_LEFT_HORIZONTAL_SCROLL: 5,
+}
+
+
+class VirtualSSD1306(object):
+    """Emulated SSD1306 controller.  Pass it as the i2c provider of a
+    display (i2c=device), or as its spi and gpio (spi=device,
+    gpio=device, dc=<any pin>) to emulate the SPI wiring.  width is the
+    number of columns the panel shows; its height follows the multiplex
+    ratio set by the display's initialization.
+    """
+
+    def __init__(self, width=128, dc_pin=None, rst_pin=None):
+        self.width = width
+        # Pins treated as DC and reset when driven through the GPIO
+        # methods.  If not given they are taken from the order displays
+        # set them up in: reset first (if used), DC last.
+        self._dc_pin = dc_pin
+        self._rst_pin = rst_pin
+        self._auto_pins = dc_pin is None and rst_pin is None
+        self.ram = bytearray(GDDRAM_COLUMNS*GDDRAM_PAGES)
+        self.address = None
+        self.power_on_reset()
+        self.reset_counters()
+
+    def power_on_reset(self):
+        """Return the controller registers to their reset values, display
+        RAM keeps its contents as on the real chip.
+        """
+        self.display_on = False
+        self.contrast = 0x7F
+        self.inverted = False
+        self.all_on = False
+        self.start_line = 0
+        self.display_offset = 0
+        self.multiplex = 64
+        self.segment_remap = False
+        self.com_scan_reversed = False
+        self.memory_mode = MEMORY_PAGE
+        self.column_start = 0
+        self.column_end = GDDRAM_COLUMNS-1
+        self.page_start = 0
+        self.page_end = GDDRAM_PAGES-1
+        self.column = 0
+        self.page = 0
+        self.scroll = None
+        self.scrolling = False
+        self.scroll_area = (0, 64)
+        self.vertical_scroll = 0
+        self._pending = []
+        self._dc = False
+
+    def reset_counters(self):
+        """Zero the bus statistics."""
+        # Writes to the device, one per I2C or SPI transfer.
+        self.transactions = 0
+        # Bytes on the bus, I2C control bytes included.
+        self.bytes = 0
+        self.command_bytes = 0
+        self.data_bytes = 0
+        # Display RAM writes made while a scroll was running, their
+        # effect on a real panel is undefined.
+        self.writes_while_scrolling = 0
+
+    def stats(self):
+        """Bus statistics as a dict."""
+        return {'transactions': self.transactions, 'bytes': self.bytes,
+                'command_bytes': self.command_bytes, 'data_bytes': self.data_bytes,
+                'writes_while_scrolling': self.writes_while_scrolling}
+
+    # I2C provider and device (Adafruit_GPIO.I2C) interface.
+
+    def get_i2c_device(self, address, **kwargs):
+        self.address = address
+        return self
+
+    def write8(self, register, value):
+        self.writeList(register, [value])
+
+    def writeList(self, register, data):
+        self.transactions += 1
+        self.bytes += len(data) + 1
+        if register & 0x40:
+            self._write_data(data)
+        else:
+            self._write_commands(data)
+
+    # SPI (Adafruit_GPIO.SPI) interface, the DC pin selects commands or
+    # data.
+
+    def set_clock_hz(self, hz):
+        pass
+
+    def write(self, data):
+        self.transactions += 1
+        self.bytes += len(data)
+        if self._dc:
+            self._write_data(data)
+        else:
+            self._write_commands(data)
+
+    # GPIO interface for the DC and reset pins.
+
+    def setup(self, pin, mode, **kwargs):
+        if self._auto_pins:
+            if self._dc_pin is not None:
+                self._rst_pin = self._dc_pin
+            self._dc_pin = pin
+
+    def output(self, pin, value):
+        if pin == self._dc_pin:
+            self._dc = bool(value)
+        elif pin == self._rst_pin and not value:
+            self.power_on_reset()
+
+    def set_high(self, pin):
+        self.output(pin, True)
+
+    def set_low(self, pin):
+        self.output(pin, False)
+
+    # Controller.
+
+    def _write_commands(self, data):
+        self.command_bytes += len(data)
+        pending = self._pending
+        for byte in data:
+            pending.append(byte)
+            if len(pending) > _PARAMETERS.get(pending[0], 0):
+                self._command(pending[0], pending[1:])
+                del pending[:]
+
+    def _command(self, op, args):
+        if op == SSD1306_SETCONTRAST:
+            self.contrast = args[0]
+        elif op == SSD1306_MEMORYMODE:
+            self.memory_mode = args[0] & 0x03
+        elif op == SSD1306_COLUMNADDR:
+            self.column_start = self.column = args[0] & 0x7F
+            self.column_end = args[1] & 0x7F
+        elif op == SSD1306_PAGEADDR:
+            self.page_start = self.page = args[0] & 0x07
+            self.page_end = args[1] & 0x07
+        elif op == SSD1306_SETMULTIPLEX:
+            self.multiplex = (args[0] & 0x3F) + 1
+        elif op == SSD1306_SETDISPLAYOFFSET:
+            self.display_offset = args[0] & 0x3F
+        elif op == SSD1306_SET_VERTICAL_SCROLL_AREA:
+            self.scroll_area = (args[0] & 0x3F, args[1] & 0x7F)
+        elif op in (SSD1306_RIGHT_HORIZONTAL_SCROLL, SSD1306_LEFT_HORIZONTAL_SCROLL):
+            self.scroll = {'left': op == SSD1306_LEFT_HORIZONTAL_SCROLL,
+                           'start_page': args[1] & 0x07, 'frames': args[2] & 0x07,
+                           'end_page': args[3] & 0x07, 'vertical_offset': 0}
+        elif op in (SSD1306_VERTICAL_AND_RIGHT_HORIZONTAL_SCROLL,
+                    SSD1306_VERTICAL_AND_LEFT_HORIZONTAL_SCROLL):
+            self.scroll = {'left': op == SSD1306_VERTICAL_AND_LEFT_HORIZONTAL_SCROLL,
+                           'start_page': args[1] & 0x07, 'frames': args[2] & 0x07,
+                           'end_page': args[3] & 0x07, 'vertical_offset': args[4] & 0x3F}
+        elif op == SSD1306_ACTIVATE_SCROLL:
+            self.scrolling = self.scroll is not None
+        elif op == SSD1306_DEACTIVATE_SCROLL:
+            self.scrolling = False
+            self.vertical_scroll = 0
+        elif SSD1306_SETSTARTLINE <= op <= SSD1306_SETSTARTLINE | 0x3F:
+            self.start_line = op & 0x3F
+        elif op in (SSD1306_SEGREMAP, SSD1306_SEGREMAP | 0x1):
+            self.segment_remap = bool(op & 0x1)
+        elif op in (SSD1306_COMSCANINC, SSD1306_COMSCANDEC):
+            self.com_scan_reversed = op == SSD1306_COMSCANDEC
+        elif op in (SSD1306_DISPLAYALLON_RESUME, SSD1306_DISPLAYALLON):
+            self.all_on = op == SSD1306_DISPLAYALLON
+        elif op in (SSD1306_NORMALDISPLAY, SSD1306_INVERTDISPLAY):
+            self.inverted = op == SSD1306_INVERTDISPLAY
+        elif op in (SSD1306_DISPLAYOFF, SSD1306_DISPLAYON):
+            self.display_on = op == SSD1306_DISPLAYON
+        elif op <= 0x0F:
+            # Page addressing mode, lower nibble of the column start.
+            self.column_start = self.column = (self.column & 0xF0) | op
+        elif op <= 0x1F:
+            # Page addressing mode, upper nibble of the column start.
+            self.column_start = self.column = ((op & 0x07) << 4) | (self.column & 0x0F)
+        elif 0xB0 <= op <= 0xB7:
+            # Page addressing mode, page start.
+            self.page = op & 0x07
+        # Timing and charge pump commands do not change what is shown.
+
+    def _write_data(self, data):
+        self.data_bytes += len(data)
+        if self.scrolling:
+            self.writes_while_scrolling += len(data)
+        ram = self.ram
+        mode = self.memory_mode
+        for byte in data:
+            ram[self.page*GDDRAM_COLUMNS + self.column] = byte
+            if mode == MEMORY_HORIZONTAL:
+                self.column += 1
+                if self.column > self.column_end:
+                    self.column = self.column_start
+                    self.page += 1
+                    if self.page > self.page_end:
+                        self.page = self.page_start
+            elif mode == MEMORY_VERTICAL:
+                self.page += 1
+                if self.page > self.page_end:
+                    self.page = self.page_start
+                    self.column += 1
+                    if self.column > self.column_end:
+                        self.column = self.column_start
+            else:
+                self.column += 1
+                if self.column >= GDDRAM_COLUMNS:
+                    self.column = self.column_start
+
+    def scroll_step(self, steps=1):
+        """Advance a running scroll by steps steps, which the controller
+        does by itself once every few frames.  Horizontal scrolling
+        rotates the scrolled pages of display RAM by one column per step;
+        vertical scrolling moves the rows of the vertical scroll area.
+        """
+        if not self.scrolling:
+            return
+        scroll = self.scroll
+        for _ in range(steps):
+            for page in range(scroll['start_page'], scroll['end_page']+1):
+                start = page*GDDRAM_COLUMNS
+                row = self.ram[start:start+GDDRAM_COLUMNS]
+                if scroll['left']:
+                    row = row[1:] + row[:1]
+                else:
+                    row = row[-1:] + row[:-1]
+                self.ram[start:start+GDDRAM_COLUMNS] = row
+            self.vertical_scroll += scroll['vertical_offset']
+
+    def pixel(self, column, row):
+        """Whether the display RAM pixel at column, row (0 to 63) is set."""
+        return (self.ram[(row >> 3)*GDDRAM_COLUMNS + column] >> (row & 7)) & 1
+
+    def frame(self):
+        """Return what the panel shows as a list of rows, each a bytearray
+        of width pixels set to 1 where lit.  Segment remap and reversed
+        COM scan, which the displays set up at initialization, give the
+        normal orientation; the other settings mirror the image.
+        """
+        width = self.width
+        height = self.multiplex
+        rows = []
+        fixed, area = self.scroll_area
+        for y in range(height):
+            if not self.display_on:
+                rows.append(bytearray(width))
+                continue
+            if self.all_on:
+                rows.append(bytearray(b'\x01'*width))
+                continue
+            line = y if self.com_scan_reversed else height-1-y
+            if self.vertical_scroll and fixed <= line < fixed + area:
+                line = fixed + (line - fixed + self.vertical_scroll) % area
+            line = (line + self.start_line + self.display_offset) % SSD1306_GDDRAM_ROWS
+            row = bytearray(width)
+            for x in range(width):
+                column = x if self.segment_remap else width-1-x
+                row[x] = self.pixel(column, line) ^ self.inverted
+            rows.append(row)
+        return rows
+
+    def _scaled_rows(self, scale):
+        for row in self.frame():
+            if scale != 1:
+                row = bytearray(pixel for pixel in row for _ in range(scale))
+            for _ in range(scale):
+                yield row
+
+    def _packed_rows(self, scale, lit):
+        # Rows packed MSB first, lit pixels set to lit and dark pixels to
+        # the other bit value.
+        for row in self._scaled_rows(scale):
+            packed = bytearray((len(row)+7)//8)
+            for x, pixel in enumerate(row):
+                if pixel == lit:
+                    packed[x >> 3] |= 0x80 >> (x & 7)
+            yield bytes(packed)
+
+    def to_pbm(self, scale=1):
+        """The panel as binary PBM (P4) data, lit pixels white."""
+        header = 'P4\n{0} {1}\n'.format(self.width*scale, self.multiplex*scale)
+        # PBM stores black as 1.
+        return header.encode('ascii') + b''.join(self._packed_rows(scale, 0))
+
+    def to_png(self, scale=1):
+        """The panel as 1 bit greyscale PNG data, lit pixels white."""
+        raw = b''.join(b'\x00' + row for row in self._packed_rows(scale, 1))
+        header = struct.pack('>IIBBBBB', self.width*scale, self.multiplex*scale,
+                             1, 0, 0, 0, 0)
+        return (b'\x89PNG\r\n\x1a\n' + _png_chunk(b'IHDR', header) +
+                _png_chunk(b'IDAT', zlib.compress(raw, 9)) + _png_chunk(b'IEND', b''))
+
+    def save_pbm(self, path, scale=1):
+        """Write the panel to a PBM file."""
+        with open(path, 'wb') as f:
+            f.write(self.to_pbm(scale))
+
+    def save_png(self, path, scale=1):
+        """Write the panel to a PNG file."""
+        with open(path, 'wb') as f:
+            f.write(self.to_png(scale))
+
+
+def _png_chunk(kind, data):
+    return (struct.pack('>I', len(data)) + kind + data +
+            struct.pack('>I', zlib.crc32(kind + data) & 0xFFFFFFFF))
+
+
+def virtual_display(display_class=SSD1306_128_64, **kwargs):
+    """Create a display of display_class on a new VirtualSSD1306 over
+    I2C, returns (display, device).  Other keyword arguments are passed
+    to the display, e.g. chunk_size.
+    """
+    device = VirtualSSD1306()
+    disp = display_class(rst=None, i2c=device, **kwargs)
+    device.width = disp.width
+    return disp, device
@@ -0,0 +1,564 @@
+# Module for the gardener's acquisition core
+# Each sensor is read once per tick by its source, the samples are kept
+# as the latest snapshot and fanned out to the sinks (console, OLED,
+# Cayenne, MQTT, Blynk), which all run concurrently in one process
+
+import asyncio
+import collections
+import logging
+import time
+from datetime import datetime
+
+import bme280lib
+import schedlib
+
+log = logging.getLogger('acqlib')
+
+def timestamp_str(t):
+  # wall clock time as shown on the console and display
+  return datetime.fromtimestamp(t).strftime("%d-%b-%Y %H:%M:%S")
+
+# what is the quality of the soil moisture, dry below dry percent and
+# mud from wet percent
+def soil_quality(smp, dry=40, wet=80):
+  if int(smp) < dry:
+    return "dry"
+  elif smp >= dry and smp < wet:
+    return "wet"
+  return "mud"
+
+# convert the analog reading (0.0 - 1.0) to a moisture percentage, sand
+# and mud are the readings of the sensor in dry sand and in mud
+def soil_moisture_percent(sm, sand, mud):
+  return round((sand - float(sm)),2)*(100/(sand - mud))
+
+# Initialize Arduino communications, returns the analog input pins
+def init_firmata(port='/dev/ttyACM0', pins=(0,)):
+  # pyfirmata is used to interface with an Arduino running the StandardFirmata image
+  import pyfirmata
+  arduino = pyfirmata.Arduino(port)
+  print("Communication Successfully started")
+  it = pyfirmata.util.Iterator(arduino)
+  it.start()
+  analog = []
+  for pin in pins:
+    #configure analog input for reading moisture sensor
+    analog.append(arduino.analog[pin])
+    analog[-1].enable_reporting()
+  # the first read of the sensor returns the NoneType, 'None'
+  print(analog[0].read())
+  time.sleep(1)
+  return analog
+
+########################################################################
+# Adrafruit modules for GPIO and SSD1306 OLED display
+# The adafruit libraries must be cloned from Adafruit repositories
+# and installed as part of circuitPython
+# example, it is suggested to check the internetmachine for current repos
+# sudo apt-get update
+# sudo apt-get install build-essential python-pip python-dev python-smbus git
+# git clone https://github.com/adafruit/Adafruit_Python_GPIO.git
+# cd Adafruit_Python_GPIO
+# sudo python3 setup.py install
+########################################################################
+
+# Initialize the SSD1306 display
+def init_ssd1306(rst=0):
+  import Adafruit_SSD1306
+  disp = Adafruit_SSD1306.SSD1306_128_64(rst=rst)
+  disp.begin()
+  disp.clear()
+  disp.display()
+  return disp
+
+# One reading of a source: values by name, taken at wall clock time
+class Sample(object):
+  __slots__ = ('source', 'time', 'values')
+
+  def __init__(self, source, time, values):
+    self.source = source
+    self.time = time
+    self.values = values
+
+  def __repr__(self):
+    return 'Sample({0!r}, {1!r}, {2!r})'.format(self.source, self.time, self.values)
+
+# A sensor read every interval seconds. read() returns a dict of values,
+# or None when there is nothing to report yet. A source reading several
+# channels at once overrides read_channels() instead, each channel's
+# values become a sample of their own under the channel's name.
+class Source(object):
+
+  def __init__(self, name, interval):
+    self.name = name
+    self.interval = interval
+
+  def read(self):
+    raise NotImplementedError
+
+  def read_channels(self):
+    # values by channel name
+    values = self.read()
+    if values is None:
+      return {}
+    return {self.name: values}
+
+# temperature (C), pressure (hPa) and humidity (%) from the BME280
+class BME280Source(Source):
+
+  def __init__(self, interval=60, device=None, name='bme280'):
+    Source.__init__(self, name, interval)
+    self.device = device
+
+  def read(self):
+    device = self.device or bme280lib.get_device()
+    temperature, pressure, humidity = device.read_all()
+    return {'temperature': temperature, 'pressure': pressure, 'humidity': humidity}
+
+# A reporting rule for a value: it is reported once it moved by more
+# than absolute, or by more than relative times its size, from the value
+# last reported, and at least every heartbeat seconds whatever it does.
+# Values that are not numbers are reported when they change.
+class Deadband(object):
+  __slots__ = ('absolute', 'relative', 'heartbeat')
+
+  def __init__(self, absolute=0.0, relative=0.0, heartbeat=None):
+    self.absolute = absolute
+    self.relative = relative
+    self.heartbeat = heartbeat
+
+  def exceeded(self, last, value):
+    if not isinstance(value, (int, float)) or not isinstance(last, (int, float)):
+      return value != last
+    return abs(value - last) > max(self.absolute, self.relative * abs(last))
+
+# Decides for a sink which values are worth sending. rules maps a value
+# e.g. 'bme280.temperature' to its Deadband, values without one follow
+# default, and are always reported when that is None. A sink with a
+# filter can check often: steady values only go out on the heartbeat,
+# a fast change goes out on the next check.
+class ReportFilter(object):
+
+  def __init__(self, rules=None, default=None, clock=time.monotonic):
+    self.rules = dict(rules or {})
+    self.default = default
+    self.clock = clock
+    # value and time last reported, by value
+    self._last = {}
+    self.reported = 0
+    self.suppressed = 0
+
+  def report(self, path, value):
+    # whether to send value now, if so it becomes the last reported
+    rule = self.rules.get(path, self.default)
+    if rule is not None:
+      now = self.clock()
+      last = self._last.get(path)
+      if (last is not None and not rule.exceeded(last[0], value)
+          and (rule.heartbeat is None or now - last[1] < rule.heartbeat)):
+        self.suppressed += 1
+        return False
+      self._last[path] = (value, now)
+    self.reported += 1
+    return True
+
+  def stats(self):
+    return {'reported': self.reported, 'suppressed': self.suppressed}
+
+# Receives the samples. handle() is called with every new sample, in
+# order, and tick() every interval seconds if the sink has an interval;
+# both run in worker threads, so they may block on I/O. A sink falling
+# behind on handle() drops its oldest queued samples. Uplinks check their
+# values with reported() so a ReportFilter can hold back the unchanged.
+class Sink(object):
+
+  def __init__(self, name, interval=None, offset=1.0, queue_size=16, report=None):
+    self.name = name
+    self.interval = interval
+    # wait for the first samples before the first tick
+    self.offset = offset
+    self.report = report
+    self.acq = None
+    self._queue = collections.deque(maxlen=queue_size)
+    self._busy = False
+    self.handled = 0
+    self.dropped = 0
+    self.errors = 0
+
+  def start(self):
+    pass
+
+  def stop(self):
+    pass
+
+  def handle(self, sample):
+    pass
+
+  def tick(self):
+    pass
+
+  def reported(self, path, value):
+    # whether to send value, always without a report filter
+    return self.report is None or self.report.report(path, value)
+
+  def stats(self):
+    stats = {'handled': self.handled, 'dropped': self.dropped, 'errors': self.errors}
+    if self.report is not None:
+      stats.update(self.report.stats())
+    return stats
+
+# The acquisition core. Sources are read on their own intervals, one
+# read per tick whatever the number of sinks, and latest holds the last
+# sample of each source for the sinks to use.
+class Acquisition(object):
+
+  def __init__(self):
+    self.sources = []
+    self.sinks = []
+    self.latest = {}
+    # wall clock for sample times and the sinks' timestamps
+    self.clock = time.time
+    self.scheduler = None
+
+  def add_source(self, source):
+    self.sources.append(source)
+    return source
+
+  def add_sink(self, sink):
+    sink.acq = self
+    self.sinks.append(sink)
+    return sink
+
+  def get(self, path, default=None):
+    # latest value of 'source.value', e.g. get('bme280.temperature')
+    source, key = path.split('.', 1)
+    sample = self.latest.get(source)
+    if sample is None:
+      return default
+    return sample.values.get(key, default)
+
+  def sample(self, source):
+    # read a source once, returns its Samples, one per channel read
+    channels = source.read_channels()
+    t = self.clock()
+    return [Sample(name, t, values) for name, values in channels.items()]
+
+  def poll(self):
+    # read every source once and hand the samples to the sinks on this
+    # thread, without the scheduler. Returns the samples.
+    samples = []
+    for source in self.sources:
+      for sample in self.sample(source):
+        self.latest[sample.source] = sample
+        samples.append(sample)
+        for sink in self.sinks:
+          sink.handle(sample)
+          sink.handled += 1
+    return samples
+
+  def stats(self):
+    stats = {'sinks': dict((sink.name, sink.stats()) for sink in self.sinks)}
+    if self.scheduler is not None:
+      stats['tasks'] = self.scheduler.stats()
+    return stats
+
+  async def _read(self, source):
+    loop = asyncio.get_event_loop()
+    samples = await loop.run_in_executor(None, self.sample, source)
+    for sample in samples:
+      self.latest[sample.source] = sample
+      for sink in self.sinks:
+        if type(sink).handle is Sink.handle:
+          continue
+        if len(sink._queue) == sink._queue.maxlen:
+          sink.dropped += 1
+        sink._queue.append(sample)
+        if not sink._busy:
+          sink._busy = True
+          loop.create_task(self._drain(sink))
+
+  async def _drain(self, sink):
+    # hand the queued samples to a sink one at a time, sinks drain
+    # concurrently so a slow uplink does not hold up the others
+    loop = asyncio.get_event_loop()
+    try:
+      while sink._queue:
+        sample = sink._queue.popleft()
+        try:
+          await loop.run_in_executor(None, sink.handle, sample)
+        except Exception:
+          sink.errors += 1
+          log.exception('sink %s failed', sink.name)
+        else:
+          sink.handled += 1
+    finally:
+      sink._busy = False
+
+  def run(self, duration=None):
+    # read and publish until ctrl-c is pressed, or for duration seconds
+    self.scheduler = scheduler = schedlib.Scheduler()
+    for source in self.sources:
+      async def read(source=source):
+        await self._read(source)
+      scheduler.every(source.interval, read, name=source.name)
+    for sink in self.sinks:
+      if sink.interval is not None:
+        scheduler.every(sink.interval, sink.tick, name=sink.name, offset=sink.offset)
+    for sink in self.sinks:
+      sink.start()
+    try:
+      scheduler.run(duration)
+    finally:
+      for sink in self.sinks:
+        sink.stop()
+
+  def stop(self):
+    # stop run(), may be called from any thread
+    if self.scheduler is not None:
+      self.scheduler.stop()
+
+# prints every sample to the terminal
+class ConsoleSink(Sink):
+
+  # label, unit and rounding of known values
+  LABELS = {
+    'temperature': ("Temperature   : ", "C", 2),
+    'pressure': ("Pressure      : ", "hPa", 2),
+    'humidity': ("Humidity      : ", "%", 2),
+    'moisture': ("Soil Moisture : ", "%", None),
+    'raw': ("Analog Raw    : ", None, None),
+    'quality': ("Quality       : ", None, None),
+  }
+
+  def __init__(self, name='console'):
+    Sink.__init__(self, name)
+
+  def handle(self, sample):
+    lines = ['Current Time  :  ' + timestamp_str(sample.time)]
+    for key, value in sample.values.items():
+      label, unit, digits = self.LABELS.get(key, (key + " : ", None, None))
+      if value is None:
+        # not measured, e.g. skipped by the BME280 profile
+        lines.append(label + " --")
+        continue
+      if digits is not None:
+        value = round(value, digits)
+      line = label + " " + str(value)
+      if unit:
+        line += " " + unit
+      lines.append(line)
+    # one print, so lines of concurrent samples do not interleave
+    print("\n".join(lines))
+
+# Shows the environment, soil and trend pages on the SSD1306 in turn,
+# one page per tick. trends is a list of (value, label, low, high) kept
+# from the samples and graphed on the trend page, by default the
+# temperature and the soil moisture. While the trend page is up a new
+# reading only shifts its graph and draws one column in the driver's
+# buffer. Frames and graph updates go through a DisplayService once the
+# sink is started, until then (e.g. with Acquisition.poll) they are
+# written directly.
+class OLEDSink(Sink):
+
+  def __init__(self, disp, interval=30, environment='bme280', soil='soil',
+               trends=None, name='oled'):
+    Sink.__init__(self, name, interval)
+    import oledlib
+    from PIL import ImageFont
+    self.disp = disp
+    self.environment = environment
+    self.soil = soil
+    if trends is None:
+      trends = [(environment + '.temperature', 'Temperature', -10, 40),
+                (soil + '.moisture', 'Soil Moisture', 0, 100)]
+    self.trends = [path.split('.', 1) for path, label, low, high in trends]
+    font = ImageFont.load_default()
+    # static layout of the pages, only changed characters are redrawn
+    glyphs = oledlib.GlyphCache(font)
+    self.environment_screen = oledlib.EnvironmentScreen(disp.width, disp.height, font, glyphs)
+    self.soil_screen = oledlib.SoilScreen(disp.width, disp.height, font, glyphs)
+    self.trend_screen = oledlib.TrendScreen(disp.width, disp.height, font,
+                                            [trend[1:] for trend in trends], disp, glyphs)
+    # screens are drawn off-screen and shown in a single swap
+    self.screen = oledlib.Compositor(disp.width, disp.height, self._show)
+    self.service = oledlib.DisplayService(disp)
+    self._started = False
+    self.pages = [self.show_environment, self.show_soil, self.show_trend]
+    self.page = 0
+
+  def handle(self, sample):
+    # keep the readings of the trend page, and graph them if it is up
+    for i, (source, key) in enumerate(self.trends):
+      if source == sample.source and key in sample.values:
+        value = sample.values[key]
+        self._update(lambda i=i, value=value: self.trend_screen.push(i, value))
+
+  def start(self):
+    # from here on the display is only written by the display service
+    self.service.start()
+    self._started = True
+
+  def stop(self):
+    self.service.stop()
+    self._started = False
+
+  def _update(self, fn):
+    # change the display with fn(), on the display service's thread
+    if self._started:
+      self.service.update(fn)
+    else:
+      fn()
+      self.disp.display()
+
+  def _show(self, frame):
+    # a page frame replaces the trend page along with the whole buffer
+    def show():
+      self.trend_screen.hide()
+      self.disp.image(frame)
+    self._update(show)
+
+  def tick(self):
+    # show the next page with data, pages without samples are skipped
+    timestampStr = timestamp_str(self.acq.clock())
+    for _ in self.pages:
+      page = self.pages[self.page]
+      self.page = (self.page + 1) % len(self.pages)
+      if page(timestampStr):
+        return
+
+  def show_environment(self, timestampStr):
+    sample = self.acq.latest.get(self.environment)
+    if sample is None:
+      return False
+    values = sample.values
+    # Update the changed text of the environment page, off-screen.
+    self.environment_screen.show(timestampStr, values['temperature'],
+                                 values['humidity'], values['pressure'])
+    self.screen.compose(self.environment_screen.image)
+    return True
+
+  def show_soil(self, timestampStr):
+    sample = self.acq.latest.get(self.soil)
+    if sample is None:
+      return False
+    values = sample.values
+    # Update the changed text of the soil page, off-screen.
+    self.soil_screen.show(timestampStr, values['moisture'], values['raw'], values['quality'])
+    self.screen.compose(self.soil_screen.image)
+    return True
+
+  def show_trend(self, timestampStr):
+    if self.trend_screen.empty():
+      return False
+    self.trend_screen.update(time=timestampStr)
+    frame = self.trend_screen.image.copy()
+    self._update(lambda: self.trend_screen.show(frame))
+    return True
+
+# Cayenne data types and units of the client's write methods
+CAYENNE_TYPES = {
+  'celsiusWrite': ('temp', 'c'),
+  'fahrenheitWrite': ('temp', 'f'),
+  'kelvinWrite': ('temp', 'k'),
+  'luxWrite': ('lum', 'lux'),
+  'pascalWrite': ('bp', 'pa'),
+  'hectoPascalWrite': ('bp', 'hpa'),
+}
+
+# Publishes the latest values with the Cayenne MQTT client every
+# interval seconds. writes is a list of (channel, client method, value)
+# e.g. (1, 'celsiusWrite', 'bme280.temperature'). The client's network
+# loop runs every loop_interval seconds. The client drops writes while
+# it is disconnected; with a spool (spoollib.Spool) the messages are
+# stored there instead, for a spoollib.ForwardSink to send. report is a
+# ReportFilter for the values.
+class CayenneSink(Sink):
+
+  def __init__(self, client, writes, interval=30, loop_interval=1, spool=None,
+               report=None, name='cayenne'):
+    Sink.__init__(self, name, loop_interval, report=report)
+    self.client = client
+    self.writes = writes
+    self.publish_interval = interval
+    self.spool = spool
+    self._next_publish = 0
+
+  def tick(self):
+    self.client.loop()
+    now = time.monotonic()
+    if now >= self._next_publish:
+      self._next_publish = now + self.publish_interval
+      self.publish()
+
+  def publish(self):
+    for channel, method, path in self.writes:
+      value = self.acq.get(path)
+      if value is None or not self.reported(path, value):
+        continue
+      if self.spool is None:
+        getattr(self.client, method)(channel, value)
+      else:
+        # the message the client's write method would publish
+        data_type, unit = CAYENNE_TYPES[method]
+        self.spool.put(self.client.getDataTopic(channel),
+                       '{0},{1}={2}'.format(data_type, unit, value))
+
+# Runs the Blynk client and answers the app's read event on trigger_vpin
+# with the latest values. vpins is a list of (value, virtual pin, color,
+# digits); alarm is (value, limit, color, message): the value's pin
+# turns color at or below limit and the message is sent every
+# alarm_every events. With a report filter only the values it lets
+# through are written, and a pin's color is only set when it changes.
+class BlynkSink(Sink):
+
+  def __init__(self, blynk, vpins, trigger_vpin, error_color='#444444',
+               alarm=None, alarm_every=6, interval=0.1, report=None, name='blynk'):
+    Sink.__init__(self, name, interval, offset=0, report=report)
+    self.blynk = blynk
+    self.vpins = vpins
+    self.error_color = error_color
+    self.alarm = alarm
+    self.alarm_every = alarm_every
+    self.cycle = 0
+    # color last set on each pin
+    self.colors = {}
+    blynk.handle_event('read V{}'.format(trigger_vpin))(self.on_read)
+
+  def tick(self):
+    # handlers run from here, so all Blynk calls are on one thread
+    self.blynk.run()
+
+  def set_color(self, vpin, color):
+    if self.report is not None and self.colors.get(vpin) == color:
+      return
+    self.colors[vpin] = color
+    self.blynk.set_property(vpin, 'color', color)
+
+  def on_read(self, pin):
+    blynk = self.blynk
+    self.cycle += 1
+    values = [self.acq.get(path) for path, vpin, color, digits in self.vpins]
+    # a source that has not been read yet is an error, a value its
+    # sensor does not measure (e.g. the pressure PROFILE_HUMIDITY skips)
+    # is None in the sample and its pin is left alone
+    read = [path.split('.', 1)[0] in self.acq.latest for path, vpin, color, digits in self.vpins]
+    if all(read):
+      for (path, vpin, color, digits), value in zip(self.vpins, values):
+        if value is None:
+          continue
+        if self.alarm is not None and path == self.alarm[0] and value <= self.alarm[1]:
+          self.set_color(vpin, self.alarm[2])
+          # send notifications not each time but every alarm_every events
+          if self.cycle % self.alarm_every == 0:
+            blynk.notify(self.alarm[3])
+            self.cycle = 0
+        else:
+          self.set_color(vpin, color)
+        if self.reported(path, value):
+          blynk.virtual_write(vpin, round(value, digits))
+    else:
+      print('[ERROR] reading sensor data')
+      # show aka 'disabled' that mean we errors on data read
+      for (path, vpin, color, digits), value in zip(self.vpins, values):
+        self.set_color(vpin, self.error_color)
+        blynk.virtual_write(vpin, value)
@@ -0,0 +1,393 @@
+########################################################################
+# Benchmarks for the sample-render-publish cycle
+# Times the hot paths on their own and one full gardener iteration,
+# with the BME280, Arduino and OLED replaced by simulated devices
+# (bme280sim, Adafruit_SSD1306.virtual), so it runs without hardware.
+#
+# python3 benchmark.py                          run and print results
+# python3 benchmark.py --json results.json      also save them
+# python3 benchmark.py --save-baseline base.json
+# python3 benchmark.py --baseline base.json     fail on regressions
+#
+# Timings only compare on the same machine, keep a baseline per machine.
+# Byte and transaction counts of the display transfers are exact and
+# any increase over the baseline is a regression.
+########################################################################
+
+import argparse
+import contextlib
+import io
+import json
+import platform
+import sys
+import time
+
+# minimum time each benchmark runs for, in seconds
+MIN_TIME = 0.5
+# fraction of the baseline's ops/sec a benchmark may lose, or of its
+# p50 latency it may gain, before it counts as a regression. p99 is
+# reported but not compared, it is too noisy on a busy Pi
+TOLERANCE = 0.25
+
+def percentile(values, p):
+  # p-th percentile of sorted values, nearest rank
+  index = int(round(p / 100.0 * (len(values) - 1)))
+  return values[index]
+
+def measure(fn, min_time=MIN_TIME):
+  # call fn repeatedly for at least min_time seconds. Fast functions are
+  # timed in batches so the timer does not dominate, each sample is the
+  # average time of one call in its batch. Returns (ops/sec, p50, p99)
+  # with latencies in microseconds.
+  number = 1
+  while True:
+    start = time.perf_counter()
+    for _ in range(number):
+      fn()
+    elapsed = time.perf_counter() - start
+    if elapsed >= 0.0002:
+      break
+    number *= 10
+  samples = []
+  total = 0.0
+  calls = 0
+  while total < min_time:
+    start = time.perf_counter()
+    for _ in range(number):
+      fn()
+    elapsed = time.perf_counter() - start
+    samples.append(elapsed / number)
+    total += elapsed
+    calls += number
+  samples.sort()
+  return calls / total, percentile(samples, 50) * 1e6, percentile(samples, 99) * 1e6
+
+########################################################################
+# benchmark cases. Each setup function returns a dict of name to
+# (function, counters) where counters is None or a function returning
+# the exact per-call counts to record for it. Setups raise ImportError
+# when a module they need is not installed, their cases are skipped.
+########################################################################
+
+def _simulated_bme280(**kwargs):
+  import bme280lib
+  import bme280sim
+  bus = bme280sim.SimulatedBus(seed=1)
+  chip = bus.add(bme280sim.SimulatedBME280(seed=1, **kwargs))
+  return bme280lib, bus, chip
+
+def setup_bme280():
+  bme280lib, bus, chip = _simulated_bme280()
+  cal = chip.calibration
+  raw = chip.raw_for(21.5, 1013.25, 55.0)
+  cases = {}
+  cases['bme280.compensate'] = (lambda: bme280lib.compensate(raw[0], raw[1], raw[2], cal), None)
+  # normal mode, so a sample is the data burst read without the wait
+  sensor = bme280lib.BME280(i2c_bus=bus, mode=bme280lib.MODE_NORMAL)
+  sensor.read_all()
+  cases['bme280.read_all'] = (sensor.read_all, None)
+  try:
+    import numpy
+  except ImportError:
+    return cases
+  rows = numpy.array([raw] * 1000)
+  cases['bme280.compensate_batch_1000'] = (lambda: bme280lib.compensate_batch(rows, cal), None)
+  return cases
+
+def setup_soil():
+  import acqlib
+  values = [i / 1023.0 for i in range(1024)]
+  def convert():
+    for sm in values:
+      acqlib.soil_moisture_percent(sm, 0.51, 0.26)
+  def quality():
+    for sm in values:
+      acqlib.soil_quality(acqlib.soil_moisture_percent(sm, 0.51, 0.26))
+  cases = {'soil.percent_1024': (convert, None),
+            'soil.quality_1024': (quality, None)}
+  import soillib
+  # a scan of all six analog inputs of an Uno
+  channels = [soillib.SoilChannel(pin, 'bed%d' % pin) for pin in range(6)]
+  scan = soillib.SoilScanSource(channels, [_StubPin() for channel in channels])
+  cases['soil.scan_6'] = (scan.read_channels, None)
+  return cases
+
+def _screen_images():
+  # the environment page for two consecutive samples
+  from PIL import ImageFont
+  import oledlib
+  font = ImageFont.load_default()
+  screen = oledlib.EnvironmentScreen(128, 64, font)
+  screen.show('17-Oct-2026 10:15:00', 21.5, 55.2, 1013.2)
+  first = screen.image.copy()
+  screen.show('17-Oct-2026 10:15:30', 21.6, 55.0, 1013.2)
+  second = screen.image.copy()
+  if screen.mismatch() is not None:
+    raise RuntimeError('environment page differs from draw.text at %r' % (screen.mismatch(),))
+  return first, second
+
+def setup_screens():
+  import random
+  from PIL import ImageFont
+  import oledlib
+  font = ImageFont.load_default()
+  glyphs = oledlib.GlyphCache(font)
+  environment = oledlib.EnvironmentScreen(128, 64, font, glyphs)
+  soil = oledlib.SoilScreen(128, 64, font, glyphs)
+  def show(rng):
+    stamp = '%02d-Oct-2026 %02d:%02d:%02d' % (rng.randint(1, 31), rng.randint(0, 23),
+                                               rng.randint(0, 59), rng.randint(0, 59))
+    environment.show(stamp, rng.uniform(-10, 40), rng.uniform(0, 100), rng.uniform(950, 1050))
+    smp = round(rng.uniform(-20, 120), 2)
+    soil.show(stamp, smp, round(rng.random(), 4), rng.choice(['dry', 'wet', 'mud']))
+  timed = random.Random(1)
+  def counters():
+    # renders of seeded random readings where the cached glyph layout
+    # differs from drawing the whole screen with draw.text
+    rng = random.Random(2)
+    mismatches = 0
+    for _ in range(100):
+      show(rng)
+      mismatches += environment.mismatch() is not None
+      mismatches += soil.mismatch() is not None
+    return {'mismatches': mismatches}
+  return {'oled.screens_show': (lambda: show(timed), counters)}
+
+def setup_display():
+  import Adafruit_SSD1306
+  from Adafruit_SSD1306.virtual import virtual_display
+  first, second = _screen_images()
+  disp, device = virtual_display(Adafruit_SSD1306.SSD1306_128_64)
+  disp.begin()
+  cases = {}
+  cases['ssd1306.image'] = (lambda: disp.image(first), None)
+
+  def counted(fn):
+    # per-call transactions and bytes of fn on the virtual device
+    def counters():
+      device.reset_counters()
+      fn()
+      return {'transactions': device.transactions, 'bytes': device.bytes}
+    return counters
+
+  def full():
+    disp.invalidate()
+    disp.display()
+  disp.image(first)
+  cases['ssd1306.display_full'] = (full, counted(full))
+
+  frames = [first, second]
+  def update():
+    # next sample's page, only the changed text is sent
+    frames.reverse()
+    disp.image(frames[0])
+    disp.display()
+  cases['ssd1306.display_update'] = (update, counted(update))
+  return cases
+
+def setup_trend():
+  import math
+  import random
+  import Adafruit_SSD1306
+  from Adafruit_SSD1306.virtual import virtual_display
+  from PIL import ImageFont
+  import oledlib
+  # a reading added to the trend page while it is up: the graph shifts
+  # one column in the driver's buffer and only the changed columns are
+  # sent. The readings are a slow swing of a few degrees with noise.
+  disp, device = virtual_display(Adafruit_SSD1306.SSD1306_128_64)
+  disp.begin()
+  font = ImageFont.load_default()
+  glyphs = oledlib.GlyphCache(font)
+  rng = random.Random(1)
+  readings = [21.5 + 4 * math.sin(k / 40.0) + rng.gauss(0, 0.3) for k in range(512)]
+  state = {}
+  def push():
+    state['trend'].push(0, readings[state['index'] % len(readings)])
+    state['index'] += 1
+    disp.display()
+  def show():
+    # the page with a full graph, as after a width of readings
+    trend = state['trend'] = oledlib.TrendScreen(
+      128, 64, font, [('Temperature', -10, 40), ('Soil Moisture', 0, 100)], disp, glyphs)
+    for value in readings[:128]:
+      trend.push(0, value)
+    state['index'] = 128
+    trend.update(time='17-Oct-2026 10:15:00')
+    trend.show(trend.image.copy())
+    disp.display()
+  show()
+  def counters():
+    # per reading, rounded up, over the next width of readings
+    show()
+    device.reset_counters()
+    for _ in range(128):
+      push()
+    return {'transactions': -(-device.transactions // 128), 'bytes': -(-device.bytes // 128)}
+  return {'oled.trend_push': (push, counters)}
+
+class _StubPin(object):
+  # analog pin of the Arduino, cycling through a few readings
+  def __init__(self):
+    self.values = [0.31, 0.42, 0.38, 0.45]
+    self.index = 0
+  def read(self):
+    self.index = (self.index + 1) % len(self.values)
+    return self.values[self.index]
+
+def setup_gardener():
+  import gardener
+  import Adafruit_SSD1306
+  from Adafruit_SSD1306.virtual import virtual_display
+  import bme280sim
+  # steady readings, so the counted display traffic is the same each run
+  bme280lib, bus, chip = _simulated_bme280(environment=bme280sim.constant_environment(),
+                                           noise=(0, 0, 0))
+  bme280lib.set_bus(bus)
+  bme280lib.configureBME280(mode=bme280lib.MODE_NORMAL)
+  disp, device = virtual_display(Adafruit_SSD1306.SSD1306_128_64)
+  pin = _StubPin()
+  with contextlib.redirect_stdout(io.StringIO()):
+    acq = gardener.build(disp, [pin], history_dir=None)
+  # one second per pass, the pages show a new time each pass
+  tick = [1792224000]
+  acq.clock = lambda: tick[0]
+  oled = [sink for sink in acq.sinks if sink.name == 'oled'][0]
+  def iteration():
+    # one read of every source and every page, on this thread and
+    # without the sleeps
+    tick[0] += 1
+    with contextlib.redirect_stdout(io.StringIO()):
+      acq.poll()
+      for page in oled.pages:
+        oled.tick()
+  def counters():
+    # count the second of two passes from a fixed starting point
+    tick[0] = 1792224000
+    pin.index = 0
+    oled.page = 0
+    iteration()
+    device.reset_counters()
+    iteration()
+    return {'transactions': device.transactions, 'bytes': device.bytes}
+  return {'gardener.iteration': (iteration, counters)}
+
+def setup_history():
+  import atexit
+  import shutil
+  import tempfile
+  import historylib
+  import querylib
+  # three days of samples, a soil reading every 10 s and the BME280
+  # every minute, in a raw ring holding the last day
+  directory = tempfile.mkdtemp()
+  atexit.register(shutil.rmtree, directory, True)
+  history = historylib.History(directory, ['bme280.temperature', 'soil.moisture'],
+                               raw_capacity=10000)
+  start = 1792224000
+  end = start + 3 * 86400
+  for t in range(start, end, 10):
+    if t % 60 == 0:
+      history.add(t, {'bme280.temperature': 20.0 + (t % 86400) / 8640.0})
+    history.add(t, {'soil.moisture': 40.0 + (t % 3600) / 360.0})
+  def last_hour():
+    list(querylib.rows(history, ['soil.moisture'], end - 3600, end))
+  def last_48h_hourly():
+    list(querylib.rows(history, ['soil.moisture'], end - 48 * 3600, end, 3600))
+  return {'history.range_1h_raw': (last_hour, None),
+          'history.range_48h_1h': (last_48h_hourly, None)}
+
+SETUPS = [setup_bme280, setup_soil, setup_display, setup_screens, setup_trend, setup_gardener,
+          setup_history]
+
+def run(selected=None, min_time=MIN_TIME):
+  # run the benchmarks whose name contains one of selected, returns
+  # the results dict saved as JSON
+  results = {}
+  skipped = {}
+  for setup in SETUPS:
+    try:
+      cases = setup()
+    except ImportError as e:
+      skipped[setup.__name__[len('setup_'):]] = str(e)
+      continue
+    for name in sorted(cases):
+      if selected and not any(s in name for s in selected):
+        continue
+      fn, counters = cases[name]
+      ops, p50, p99 = measure(fn, min_time)
+      result = {'ops_per_sec': ops, 'p50_us': p50, 'p99_us': p99}
+      if counters is not None:
+        result.update(counters())
+      results[name] = result
+      print(format_result(name, result))
+  for group, reason in sorted(skipped.items()):
+    print('skipped %s: %s' % (group, reason))
+  return {'python': platform.python_version(), 'machine': platform.machine(),
+          'time': time.strftime('%Y-%m-%dT%H:%M:%S'), 'benchmarks': results,
+          'skipped': skipped}
+
+def format_result(name, result):
+  line = '%-32s %12.1f ops/s  p50 %10.2f us  p99 %10.2f us' % (
+    name, result['ops_per_sec'], result['p50_us'], result['p99_us'])
+  if 'bytes' in result:
+    line += '  %d tx %d bytes' % (result['transactions'], result['bytes'])
+  if 'mismatches' in result:
+    line += '  %d mismatches' % result['mismatches']
+  return line
+
+def compare(results, baseline, tolerance=TOLERANCE, selected=None):
+  # list of regressions of results against baseline, for the benchmarks
+  # whose name contains one of selected
+  regressions = []
+  for name, base in sorted(baseline['benchmarks'].items()):
+    if selected and not any(s in name for s in selected):
+      continue
+    result = results['benchmarks'].get(name)
+    if result is None:
+      # its setup was skipped, or it was renamed or removed
+      regressions.append('%s: missing from the results' % name)
+      continue
+    if result['ops_per_sec'] < base['ops_per_sec'] * (1 - tolerance):
+      regressions.append('%s: %.1f ops/s, baseline %.1f ops/s' % (
+        name, result['ops_per_sec'], base['ops_per_sec']))
+    if result['p50_us'] > base['p50_us'] * (1 + tolerance):
+      regressions.append('%s: p50 %.2f us, baseline %.2f us' % (
+        name, result['p50_us'], base['p50_us']))
+    for counter in ('transactions', 'bytes', 'mismatches'):
+      if counter in base and result.get(counter, 0) > base[counter]:
+        regressions.append('%s: %d %s, baseline %d' % (
+          name, result[counter], counter, base[counter]))
+  return regressions
+
+def main(argv=None):
+  parser = argparse.ArgumentParser(description='Benchmark the gardener hot paths.')
+  parser.add_argument('names', nargs='*', help='only run benchmarks whose name contains one of these')
+  parser.add_argument('--json', help='write the results to this file')
+  parser.add_argument('--save-baseline', metavar='FILE', help='write the results as the baseline')
+  parser.add_argument('--baseline', metavar='FILE', help='compare against this baseline, exit 1 on regressions')
+  parser.add_argument('--tolerance', type=float, default=TOLERANCE,
+                      help='allowed slowdown as a fraction of the baseline (default %(default)s)')
+  parser.add_argument('--min-time', type=float, default=MIN_TIME,
+                      help='seconds to run each benchmark for (default %(default)s)')
+  args = parser.parse_args(argv)
+
+  results = run(args.names, args.min_time)
+  for path in (args.json, args.save_baseline):
+    if path:
+      with open(path, 'w') as f:
+        json.dump(results, f, indent=2, sort_keys=True)
+  if args.baseline:
+    with open(args.baseline) as f:
+      baseline = json.load(f)
+    regressions = compare(results, baseline, args.tolerance, args.names)
+    if regressions:
+      print('REGRESSIONS against %s:' % args.baseline)
+      for regression in regressions:
+        print('  ' + regression)
+      return 1
+    print('no regressions against %s' % args.baseline)
+  return 0
+
+if __name__=="__main__":
+  sys.exit(main())
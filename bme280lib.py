@@ -6,13 +6,40 @@ from ctypes import c_short
 from ctypes import c_byte
 from ctypes import c_ubyte
 
-import smbus
-
 # Default BME280 device I2C address
 DEVICE = 0x76 
 
-bus = smbus.SMBus(1) # Rev 2 Pi, Pi 2 & Pi 3 uses bus 1
-                     # Rev 1 Pi uses bus 0
+# Default I2C bus number
+BUS = 1 # Rev 2 Pi, Pi 2 & Pi 3 uses bus 1
+        # Rev 1 Pi uses bus 0
+
+# open buses, keyed by bus number. smbus is only imported and the bus
+# only opened the first time a device actually talks to it, so the
+# module can be imported on machines without /dev/i2c-*
+_buses = {}
+
+def get_bus(busnum=BUS):
+  # return the shared bus object for busnum, opening it on first use
+  i2c_bus = _buses.get(busnum)
+  if i2c_bus is None:
+    import smbus
+    i2c_bus = _buses[busnum] = smbus.SMBus(busnum)
+  return i2c_bus
+
+def set_bus(i2c_bus, busnum=BUS):
+  # use i2c_bus for busnum instead of opening an SMBus, any object with
+  # read_i2c_block_data() and write_byte_data() will do
+  _buses[busnum] = i2c_bus
+  # devices already created for busnum pick up the new bus
+  for device in _devices.values():
+    if device._busnum == busnum:
+      device._bus = None
+
+def __getattr__(name):
+  # keep bme280lib.bus working, without opening the bus at import
+  if name == 'bus':
+    return get_bus()
+  raise AttributeError("module {!r} has no attribute {!r}".format(__name__, name))
 
 def getShort(data, index):
   # return two bytes from data as a signed 16-bit value
@@ -34,108 +61,353 @@ def getUChar(data,index):
   result =  data[index] & 0xFF
   return result
 
-def readBME280ID(addr=DEVICE):
-  # Chip ID Register Address
-  REG_ID     = 0xD0
-  (chip_id, chip_version) = bus.read_i2c_block_data(addr, REG_ID, 2)
-  return (chip_id, chip_version)
+# Register Addresses
+REG_ID = 0xD0
+REG_RESET = 0xE0
+REG_DATA = 0xF7
+REG_CONTROL = 0xF4
+REG_CONFIG  = 0xF5
+REG_CONTROL_HUM = 0xF2
 
-def readBME280All(addr=DEVICE):
-  # Register Addresses
-  REG_DATA = 0xF7
-  REG_CONTROL = 0xF4
-  REG_CONFIG  = 0xF5
-
-  REG_CONTROL_HUM = 0xF2
-  REG_HUM_MSB = 0xFD
-  REG_HUM_LSB = 0xFE
-
-  # Oversample setting - page 27
-  OVERSAMPLE_TEMP = 2
-  OVERSAMPLE_PRES = 2
-  MODE = 1
-
-  # Oversample setting for humidity register - page 26
-  OVERSAMPLE_HUM = 2
-  bus.write_byte_data(addr, REG_CONTROL_HUM, OVERSAMPLE_HUM)
-
-  control = OVERSAMPLE_TEMP<<5 | OVERSAMPLE_PRES<<2 | MODE
-  bus.write_byte_data(addr, REG_CONTROL, control)
-
-  # Read blocks of calibration data from EEPROM
-  # See Page 22 data sheet
-  cal1 = bus.read_i2c_block_data(addr, 0x88, 24)
-  cal2 = bus.read_i2c_block_data(addr, 0xA1, 1)
-  cal3 = bus.read_i2c_block_data(addr, 0xE1, 7)
-
-  # Convert byte data to word values
-  dig_T1 = getUShort(cal1, 0)
-  dig_T2 = getShort(cal1, 2)
-  dig_T3 = getShort(cal1, 4)
-
-  dig_P1 = getUShort(cal1, 6)
-  dig_P2 = getShort(cal1, 8)
-  dig_P3 = getShort(cal1, 10)
-  dig_P4 = getShort(cal1, 12)
-  dig_P5 = getShort(cal1, 14)
-  dig_P6 = getShort(cal1, 16)
-  dig_P7 = getShort(cal1, 18)
-  dig_P8 = getShort(cal1, 20)
-  dig_P9 = getShort(cal1, 22)
-
-  dig_H1 = getUChar(cal2, 0)
-  dig_H2 = getShort(cal3, 0)
-  dig_H3 = getUChar(cal3, 2)
-
-  dig_H4 = getChar(cal3, 3)
-  dig_H4 = (dig_H4 << 24) >> 20
-  dig_H4 = dig_H4 | (getChar(cal3, 4) & 0x0F)
-
-  dig_H5 = getChar(cal3, 5)
-  dig_H5 = (dig_H5 << 24) >> 20
-  dig_H5 = dig_H5 | (getUChar(cal3, 4) >> 4 & 0x0F)
-
-  dig_H6 = getChar(cal3, 6)
-
-  # Wait in ms (Datasheet Appendix B: Measurement time and current calculation)
-  wait_time = 1.25 + (2.3 * OVERSAMPLE_TEMP) + ((2.3 * OVERSAMPLE_PRES) + 0.575) + ((2.3 * OVERSAMPLE_HUM)+0.575)
-  time.sleep(wait_time/1000)  # Wait the required time  
-
-  # Read temperature/pressure/humidity
-  data = bus.read_i2c_block_data(addr, REG_DATA, 8)
-  pres_raw = (data[0] << 12) | (data[1] << 4) | (data[2] >> 4)
-  temp_raw = (data[3] << 12) | (data[4] << 4) | (data[5] >> 4)
-  hum_raw = (data[6] << 8) | data[7]
+# Writing this value to REG_RESET performs a power-on style soft reset
+SOFT_RESET = 0xB6
+
+# Power modes, ctrl_meas bits 1:0 - page 27
+MODE_SLEEP = 0
+MODE_FORCED = 1
+MODE_NORMAL = 3
+
+# Standby time between conversions in normal mode, config bits 7:5 - page 28
+STANDBY_0_5_MS = 0
+STANDBY_62_5_MS = 1
+STANDBY_125_MS = 2
+STANDBY_250_MS = 3
+STANDBY_500_MS = 4
+STANDBY_1000_MS = 5
+STANDBY_10_MS = 6
+STANDBY_20_MS = 7
+
+# IIR filter coefficient, config bits 4:2 - page 28
+FILTER_OFF = 0
+FILTER_2 = 1
+FILTER_4 = 2
+FILTER_8 = 3
+FILTER_16 = 4
+
+# Oversampling settings for ctrl_hum and ctrl_meas - page 26, 27
+OVERSAMPLE_SKIP = 0
+OVERSAMPLE_X1 = 1
+OVERSAMPLE_X2 = 2
+OVERSAMPLE_X4 = 3
+OVERSAMPLE_X8 = 4
+OVERSAMPLE_X16 = 5
+
+# A named set of oversampling settings together with the maximum time a
+# forced conversion takes with them, so the driver sleeps no longer than
+# the profile needs
+class Profile(object):
+  __slots__ = ('name', 'temp', 'pres', 'hum', 'max_time')
+
+  def __init__(self, name, temp, pres, hum):
+    if temp == OVERSAMPLE_SKIP:
+      raise ValueError('temperature is needed to compensate pressure and humidity')
+    for osrs in (temp, pres, hum):
+      if not OVERSAMPLE_SKIP <= osrs <= OVERSAMPLE_X16:
+        raise ValueError('oversampling must be one of the OVERSAMPLE_* values')
+    self.name = name
+    self.temp = temp
+    self.pres = pres
+    self.hum = hum
+    # Max measurement time in ms, skipped channels do not add to it
+    # (Datasheet Appendix B: Measurement time and current calculation)
+    max_time = 1.25 + 2.3 * (1 << (temp - 1))
+    if pres != OVERSAMPLE_SKIP:
+      max_time += 2.3 * (1 << (pres - 1)) + 0.575
+    if hum != OVERSAMPLE_SKIP:
+      max_time += 2.3 * (1 << (hum - 1)) + 0.575
+    self.max_time = max_time
+
+  def __repr__(self):
+    return 'Profile({0!r}, {1}, {2}, {3})'.format(self.name, self.temp, self.pres, self.hum)
+
+# Recommended settings - page 19
+PROFILE_ULTRA_LOW_POWER = Profile('ultra-low-power', OVERSAMPLE_X1, OVERSAMPLE_X1, OVERSAMPLE_X1)
+PROFILE_STANDARD = Profile('standard', OVERSAMPLE_X2, OVERSAMPLE_X2, OVERSAMPLE_X2)
+PROFILE_HIGH_RESOLUTION = Profile('high-resolution', OVERSAMPLE_X2, OVERSAMPLE_X16, OVERSAMPLE_X1)
+PROFILE_HUMIDITY = Profile('humidity', OVERSAMPLE_X1, OVERSAMPLE_SKIP, OVERSAMPLE_X1)
+
+PROFILES = dict((profile.name, profile) for profile in
+                (PROFILE_ULTRA_LOW_POWER, PROFILE_STANDARD,
+                 PROFILE_HIGH_RESOLUTION, PROFILE_HUMIDITY))
+
+# Calibration coefficients, decoded once per device
+# See Page 22 data sheet
+class Calibration(object):
+  __slots__ = ('dig_T1', 'dig_T2', 'dig_T3',
+               'dig_P1', 'dig_P2', 'dig_P3', 'dig_P4', 'dig_P5',
+               'dig_P6', 'dig_P7', 'dig_P8', 'dig_P9',
+               'dig_H1', 'dig_H2', 'dig_H3', 'dig_H4', 'dig_H5', 'dig_H6')
+
+  def __init__(self, cal1, cal2, cal3):
+    # Convert byte data to word values
+    self.dig_T1 = getUShort(cal1, 0)
+    self.dig_T2 = getShort(cal1, 2)
+    self.dig_T3 = getShort(cal1, 4)
+
+    self.dig_P1 = getUShort(cal1, 6)
+    self.dig_P2 = getShort(cal1, 8)
+    self.dig_P3 = getShort(cal1, 10)
+    self.dig_P4 = getShort(cal1, 12)
+    self.dig_P5 = getShort(cal1, 14)
+    self.dig_P6 = getShort(cal1, 16)
+    self.dig_P7 = getShort(cal1, 18)
+    self.dig_P8 = getShort(cal1, 20)
+    self.dig_P9 = getShort(cal1, 22)
+
+    self.dig_H1 = getUChar(cal2, 0)
+    self.dig_H2 = getShort(cal3, 0)
+    self.dig_H3 = getUChar(cal3, 2)
+
+    dig_H4 = getChar(cal3, 3)
+    dig_H4 = (dig_H4 << 24) >> 20
+    self.dig_H4 = dig_H4 | (getChar(cal3, 4) & 0x0F)
+
+    dig_H5 = getChar(cal3, 5)
+    dig_H5 = (dig_H5 << 24) >> 20
+    self.dig_H5 = dig_H5 | (getUChar(cal3, 4) >> 4 & 0x0F)
+
+    self.dig_H6 = getChar(cal3, 6)
+
+  @classmethod
+  def read(cls, bus, addr):
+    # Read blocks of calibration data from EEPROM
+    cal1 = bus.read_i2c_block_data(addr, 0x88, 24)
+    cal2 = bus.read_i2c_block_data(addr, 0xA1, 1)
+    cal3 = bus.read_i2c_block_data(addr, 0xE1, 7)
+    return cls(cal1, cal2, cal3)
+
+def compensate(pres_raw, temp_raw, hum_raw, cal):
+  # convert raw ADC values to temperature (C), pressure (hPa), humidity (%)
+  dig_T1 = cal.dig_T1
 
   #Refine temperature
-  var1 = ((((temp_raw>>3)-(dig_T1<<1)))*(dig_T2)) >> 11
-  var2 = (((((temp_raw>>4) - (dig_T1)) * ((temp_raw>>4) - (dig_T1))) >> 12) * (dig_T3)) >> 14
+  var1 = ((((temp_raw>>3)-(dig_T1<<1)))*(cal.dig_T2)) >> 11
+  var2 = (((((temp_raw>>4) - (dig_T1)) * ((temp_raw>>4) - (dig_T1))) >> 12) * (cal.dig_T3)) >> 14
   t_fine = var1+var2
   temperature = float(((t_fine * 5) + 128) >> 8);
 
   # Refine pressure and adjust for temperature
   var1 = t_fine / 2.0 - 64000.0
-  var2 = var1 * var1 * dig_P6 / 32768.0
-  var2 = var2 + var1 * dig_P5 * 2.0
-  var2 = var2 / 4.0 + dig_P4 * 65536.0
-  var1 = (dig_P3 * var1 * var1 / 524288.0 + dig_P2 * var1) / 524288.0
-  var1 = (1.0 + var1 / 32768.0) * dig_P1
+  var2 = var1 * var1 * cal.dig_P6 / 32768.0
+  var2 = var2 + var1 * cal.dig_P5 * 2.0
+  var2 = var2 / 4.0 + cal.dig_P4 * 65536.0
+  var1 = (cal.dig_P3 * var1 * var1 / 524288.0 + cal.dig_P2 * var1) / 524288.0
+  var1 = (1.0 + var1 / 32768.0) * cal.dig_P1
   if var1 == 0:
     pressure=0
   else:
     pressure = 1048576.0 - pres_raw
     pressure = ((pressure - var2 / 4096.0) * 6250.0) / var1
-    var1 = dig_P9 * pressure * pressure / 2147483648.0
-    var2 = pressure * dig_P8 / 32768.0
-    pressure = pressure + (var1 + var2 + dig_P7) / 16.0
+    var1 = cal.dig_P9 * pressure * pressure / 2147483648.0
+    var2 = pressure * cal.dig_P8 / 32768.0
+    pressure = pressure + (var1 + var2 + cal.dig_P7) / 16.0
 
   # Refine humidity
   humidity = t_fine - 76800.0
-  humidity = (hum_raw - (dig_H4 * 64.0 + dig_H5 / 16384.0 * humidity)) * (dig_H2 / 65536.0 * (1.0 + dig_H6 / 67108864.0 * humidity * (1.0 + dig_H3 / 67108864.0 * humidity)))
-  humidity = humidity * (1.0 - dig_H1 * humidity / 524288.0)
+  humidity = (hum_raw - (cal.dig_H4 * 64.0 + cal.dig_H5 / 16384.0 * humidity)) * (cal.dig_H2 / 65536.0 * (1.0 + cal.dig_H6 / 67108864.0 * humidity * (1.0 + cal.dig_H3 / 67108864.0 * humidity)))
+  humidity = humidity * (1.0 - cal.dig_H1 * humidity / 524288.0)
   if humidity > 100:
     humidity = 100
   elif humidity < 0:
     humidity = 0
 
   return temperature/100.0,pressure/100.0,humidity
+
+def compensate_batch(raw_array, cal):
+  # vectorised compensate() for recorded samples, raw_array holds rows of
+  # (pres_raw, temp_raw, hum_raw). Returns temperature, pressure and
+  # humidity arrays, bit for bit equal to calling compensate() per row.
+  # Needs numpy, which is only imported here.
+  import numpy
+
+  raw = numpy.asarray(raw_array, dtype=numpy.int64).reshape(-1, 3)
+  pres_raw = raw[:, 0]
+  temp_raw = raw[:, 1]
+  hum_raw = raw[:, 2]
+  dig_T1 = cal.dig_T1
+
+  #Refine temperature
+  var1 = ((((temp_raw>>3)-(dig_T1<<1)))*(cal.dig_T2)) >> 11
+  var2 = (((((temp_raw>>4) - (dig_T1)) * ((temp_raw>>4) - (dig_T1))) >> 12) * (cal.dig_T3)) >> 14
+  t_fine = var1+var2
+  temperature = (((t_fine * 5) + 128) >> 8).astype(numpy.float64)
+
+  # Refine pressure and adjust for temperature
+  var1 = t_fine / 2.0 - 64000.0
+  var2 = var1 * var1 * cal.dig_P6 / 32768.0
+  var2 = var2 + var1 * cal.dig_P5 * 2.0
+  var2 = var2 / 4.0 + cal.dig_P4 * 65536.0
+  var1 = (cal.dig_P3 * var1 * var1 / 524288.0 + cal.dig_P2 * var1) / 524288.0
+  var1 = (1.0 + var1 / 32768.0) * cal.dig_P1
+  # same guard as compensate(), rows with var1 == 0 report 0 pressure
+  invalid = var1 == 0
+  with numpy.errstate(divide='ignore', invalid='ignore'):
+    pressure = 1048576.0 - pres_raw
+    pressure = ((pressure - var2 / 4096.0) * 6250.0) / var1
+    var1 = cal.dig_P9 * pressure * pressure / 2147483648.0
+    var2 = pressure * cal.dig_P8 / 32768.0
+    pressure = pressure + (var1 + var2 + cal.dig_P7) / 16.0
+  pressure[invalid] = 0.0
+
+  # Refine humidity
+  humidity = t_fine - 76800.0
+  humidity = (hum_raw - (cal.dig_H4 * 64.0 + cal.dig_H5 / 16384.0 * humidity)) * (cal.dig_H2 / 65536.0 * (1.0 + cal.dig_H6 / 67108864.0 * humidity * (1.0 + cal.dig_H3 / 67108864.0 * humidity)))
+  humidity = humidity * (1.0 - cal.dig_H1 * humidity / 524288.0)
+  humidity = numpy.clip(humidity, 0, 100)
+
+  return temperature/100.0,pressure/100.0,humidity
+
+# A single BME280 on a bus. The calibration block is read from the chip
+# the first time it is needed and kept until refresh_calibration() or
+# reset() is called, so each sample only costs the control writes and
+# the data burst read.
+# In normal mode the chip converts continuously on its own, so once
+# configured a sample is just the 8 byte data burst read.
+class BME280(object):
+  __slots__ = ('_bus', '_busnum', 'addr', '_calibration', 'profile',
+               'mode', 'standby', 'iir_filter', '_configured')
+
+  def __init__(self, addr=DEVICE, i2c_bus=None, mode=MODE_FORCED,
+               standby=STANDBY_0_5_MS, iir_filter=FILTER_OFF,
+               profile=PROFILE_STANDARD):
+    # i2c_bus is a bus number, or a bus object to use directly
+    if i2c_bus is None:
+      i2c_bus = BUS
+    if isinstance(i2c_bus, int):
+      self._bus = None
+      self._busnum = i2c_bus
+    else:
+      self._bus = i2c_bus
+      self._busnum = None
+    self.addr = addr
+    self._calibration = None
+    self.profile = PROFILES[profile] if isinstance(profile, str) else profile
+    self.mode = mode
+    self.standby = standby
+    self.iir_filter = iir_filter
+    self._configured = False
+
+  @property
+  def bus(self):
+    if self._bus is None:
+      self._bus = get_bus(self._busnum)
+    return self._bus
+
+  @property
+  def calibration(self):
+    if self._calibration is None:
+      self._calibration = Calibration.read(self.bus, self.addr)
+    return self._calibration
+
+  def refresh_calibration(self):
+    # re-read the calibration block, e.g. after swapping the sensor
+    self._calibration = Calibration.read(self.bus, self.addr)
+    return self._calibration
+
+  def reset(self):
+    # soft reset the chip, calibration and configuration are
+    # rewritten on the next sample
+    self.bus.write_byte_data(self.addr, REG_RESET, SOFT_RESET)
+    self._calibration = None
+    self._configured = False
+
+  def configure(self, mode=None, standby=None, iir_filter=None, profile=None):
+    # change the power mode, standby time, IIR filter or oversampling
+    # profile (a Profile or one of the PROFILES names), the chip is
+    # reprogrammed on the next sample
+    if profile is not None:
+      self.profile = PROFILES[profile] if isinstance(profile, str) else profile
+    if mode is not None:
+      if mode not in (MODE_FORCED, MODE_NORMAL):
+        raise ValueError('mode must be MODE_FORCED or MODE_NORMAL')
+      self.mode = mode
+    if standby is not None:
+      if not 0 <= standby <= 7:
+        raise ValueError('standby must be one of the STANDBY_* values')
+      self.standby = standby
+    if iir_filter is not None:
+      if not 0 <= iir_filter <= 4:
+        raise ValueError('iir_filter must be one of the FILTER_* values')
+      self.iir_filter = iir_filter
+    self._configured = False
+
+  def read_id(self):
+    (chip_id, chip_version) = self.bus.read_i2c_block_data(self.addr, REG_ID, 2)
+    return (chip_id, chip_version)
+
+  def _configure_normal(self, ctrl_hum, control, wait_time):
+    # config is only guaranteed to be written in sleep mode - page 28
+    self.bus.write_byte_data(self.addr, REG_CONTROL, control | MODE_SLEEP)
+    self.bus.write_byte_data(self.addr, REG_CONFIG, self.standby<<5 | self.iir_filter<<2)
+    self.bus.write_byte_data(self.addr, REG_CONTROL_HUM, ctrl_hum)
+    self.bus.write_byte_data(self.addr, REG_CONTROL, control | MODE_NORMAL)
+    # let the first conversion complete before the data registers are read
+    time.sleep(wait_time/1000)
+    self._configured = True
+
+  def read_raw(self):
+    profile = self.profile
+    ctrl_hum = profile.hum
+    control = profile.temp<<5 | profile.pres<<2
+    wait_time = profile.max_time
+    if self.mode == MODE_NORMAL:
+      if not self._configured:
+        self._configure_normal(ctrl_hum, control, wait_time)
+    else:
+      if not self._configured:
+        self.bus.write_byte_data(self.addr, REG_CONFIG, self.standby<<5 | self.iir_filter<<2)
+        self._configured = True
+      self.bus.write_byte_data(self.addr, REG_CONTROL_HUM, ctrl_hum)
+      self.bus.write_byte_data(self.addr, REG_CONTROL, control | MODE_FORCED)
+      time.sleep(wait_time/1000)  # Wait the required time
+
+    # Read temperature/pressure/humidity
+    data = self.bus.read_i2c_block_data(self.addr, REG_DATA, 8)
+    pres_raw = (data[0] << 12) | (data[1] << 4) | (data[2] >> 4)
+    temp_raw = (data[3] << 12) | (data[4] << 4) | (data[5] >> 4)
+    hum_raw = (data[6] << 8) | data[7]
+    return pres_raw, temp_raw, hum_raw
+
+  def read_all(self):
+    # pressure or humidity are None when the profile skips them
+    pres_raw, temp_raw, hum_raw = self.read_raw()
+    temperature, pressure, humidity = compensate(pres_raw, temp_raw, hum_raw, self.calibration)
+    if self.profile.pres == OVERSAMPLE_SKIP:
+      pressure = None
+    if self.profile.hum == OVERSAMPLE_SKIP:
+      humidity = None
+    return temperature, pressure, humidity
+
+# shared device instances, keyed by (bus, address)
+_devices = {}
+
+def get_device(addr=DEVICE, i2c_bus=None):
+  # return the shared BME280 instance for this bus and address,
+  # i2c_bus is a bus number (default BUS) or a bus object
+  key = (BUS if i2c_bus is None else i2c_bus, addr)
+  device = _devices.get(key)
+  if device is None:
+    device = _devices[key] = BME280(addr, i2c_bus)
+  return device
+
+def readBME280ID(addr=DEVICE):
+  return get_device(addr).read_id()
+
+def readBME280All(addr=DEVICE):
+  return get_device(addr).read_all()
+
+def configureBME280(mode=None, standby=None, iir_filter=None, profile=None, addr=DEVICE):
+  # e.g. configureBME280(MODE_NORMAL, STANDBY_1000_MS, FILTER_4) to let
+  # the sensor sample continuously instead of on every readBME280All(),
+  # or configureBME280(profile='ultra-low-power') for quicker conversions
+  get_device(addr).configure(mode, standby, iir_filter, profile)
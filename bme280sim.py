@@ -0,0 +1,303 @@
+# Simulated I2C bus and BME280 for running bme280lib without hardware
+# The chip model implements the BME280 register map and turns a
+# configurable environment into raw readings by inverting the
+# datasheet compensation, the bus adds latency and NACKs per transaction
+#
+# e.g.
+#   bus = bme280sim.SimulatedBus(latency=0.0005, nack_rate=0.01, seed=1)
+#   bus.add(bme280sim.SimulatedBME280(seed=1))
+#   bme280lib.set_bus(bus)
+#   bme280lib.readBME280All()
+
+import errno
+import math
+import random
+import threading
+import time
+
+import bme280lib
+
+CHIP_ID = 0x60
+
+REG_STATUS = 0xF3
+REG_CALIB_00 = 0x88
+REG_CALIB_26 = 0xA1
+REG_CALIB_H2 = 0xE1
+
+# readings of a skipped channel - page 26
+SKIPPED_20BIT = 0x80000
+SKIPPED_16BIT = 0x8000
+
+# Calibration of the simulated chip, values of the Bosch reference
+# driver's example and a typical humidity block
+DEFAULT_CALIBRATION = {
+  'dig_T1': 27504, 'dig_T2': 26435, 'dig_T3': -1000,
+  'dig_P1': 36477, 'dig_P2': -10685, 'dig_P3': 3024, 'dig_P4': 2855,
+  'dig_P5': 140, 'dig_P6': -7, 'dig_P7': 15500, 'dig_P8': -14600, 'dig_P9': 6000,
+  'dig_H1': 75, 'dig_H2': 362, 'dig_H3': 0, 'dig_H4': 313, 'dig_H5': 50, 'dig_H6': 30,
+}
+
+def calibration_registers(cal):
+  # encode calibration coefficients as the three register blocks
+  # 0x88-0x9F, 0xA1 and 0xE1-0xE7
+  def short(value):
+    value &= 0xFFFF
+    return [value & 0xFF, value >> 8]
+  cal1 = short(cal['dig_T1']) + short(cal['dig_T2']) + short(cal['dig_T3'])
+  for n in range(1, 10):
+    cal1 += short(cal['dig_P%d' % n])
+  cal2 = [cal['dig_H1'] & 0xFF]
+  h4 = cal['dig_H4'] & 0xFFF
+  h5 = cal['dig_H5'] & 0xFFF
+  cal3 = short(cal['dig_H2']) + [cal['dig_H3'] & 0xFF, h4 >> 4,
+                                 (h4 & 0x0F) | (h5 & 0x0F) << 4, h5 >> 4,
+                                 cal['dig_H6'] & 0xFF]
+  return cal1, cal2, cal3
+
+def daily_environment(t):
+  # default environment curve, a day's swing of temperature and
+  # humidity around a greenhouse average with slow pressure drift.
+  # t is in seconds, returns (C, hPa, %)
+  day = 2 * math.pi * t / 86400.0
+  temperature = 21.0 + 6.0 * math.sin(day)
+  pressure = 1013.25 + 4.0 * math.sin(day / 3.0)
+  humidity = 60.0 - 15.0 * math.sin(day)
+  return temperature, pressure, humidity
+
+def constant_environment(temperature=21.0, pressure=1013.25, humidity=60.0):
+  # environment curve that never changes
+  return lambda t: (temperature, pressure, humidity)
+
+def _bisect(f, target, lo, hi, increasing=True):
+  # smallest integer in lo..hi whose f() reaches target
+  while lo < hi:
+    mid = (lo + hi) // 2
+    value = f(mid)
+    if (value >= target) if increasing else (value <= target):
+      hi = mid
+    else:
+      lo = mid + 1
+  return lo
+
+# BME280 register model. Conversions take the datasheet's maximum time
+# for the oversampling in use, forced mode returns to sleep afterwards
+# and normal mode converts every measurement plus standby period. Data
+# registers hold the last finished conversion, with the IIR filter
+# applied to temperature and pressure as on the chip.
+class SimulatedBME280(object):
+
+  def __init__(self, environment=daily_environment, calibration=None,
+               noise=(0.02, 0.01, 0.1), clock=None, seed=None, addr=bme280lib.DEVICE):
+    self.addr = addr
+    self.environment = environment
+    # standard deviation of the noise added to (C, hPa, %)
+    self.noise = noise
+    self.clock = time.monotonic if clock is None else clock
+    self.random = random.Random(seed)
+    cal = dict(DEFAULT_CALIBRATION)
+    cal.update(calibration or {})
+    cal1, cal2, cal3 = calibration_registers(cal)
+    self.calibration = bme280lib.Calibration(cal1, cal2, cal3)
+    self._nvm = {REG_CALIB_00: cal1, REG_CALIB_26: cal2, REG_CALIB_H2: cal3}
+    self._start = self.clock()
+    self.conversions = 0
+    self.soft_reset()
+
+  def soft_reset(self):
+    # registers back to their power on values, calibration is kept
+    regs = self.registers = bytearray(256)
+    for reg, block in self._nvm.items():
+      regs[reg:reg+len(block)] = bytearray(block)
+    regs[bme280lib.REG_ID] = CHIP_ID
+    self._ctrl_hum = 0
+    self._busy_until = None
+    self._next_conversion = None
+    self._filtered = None
+    self._store(SKIPPED_20BIT, SKIPPED_20BIT, SKIPPED_16BIT)
+
+  def raw_for(self, temperature, pressure, humidity):
+    # invert the compensation, the raw readings that compensate() turns
+    # into these values (to its resolution)
+    cal = self.calibration
+    def compensated(pres_raw, temp_raw, hum_raw):
+      return bme280lib.compensate(pres_raw, temp_raw, hum_raw, cal)
+    temp_raw = _bisect(lambda raw: compensated(0, raw, 0)[0], temperature, 0, 0xFFFFF)
+    pres_raw = _bisect(lambda raw: compensated(raw, temp_raw, 0)[1], pressure,
+                       0, 0xFFFFF, increasing=False)
+    hum_raw = _bisect(lambda raw: compensated(0, temp_raw, raw)[2], humidity, 0, 0xFFFF)
+    return pres_raw, temp_raw, hum_raw
+
+  def _conversion_time(self):
+    # max measurement time in seconds for the current ctrl registers
+    ctrl_meas = self.registers[bme280lib.REG_CONTROL]
+    osrs_t = ctrl_meas >> 5
+    osrs_p = ctrl_meas >> 2 & 0x07
+    osrs_h = self._ctrl_hum & 0x07
+    max_time = 1.25
+    for osrs, extra in ((osrs_t, 0), (osrs_p, 0.575), (osrs_h, 0.575)):
+      if osrs:
+        max_time += 2.3 * (1 << (min(osrs, 5) - 1)) + extra
+    return max_time / 1000.0
+
+  def _coefficient(self):
+    # IIR filter coefficient, config bits 4:2 - page 28
+    return (0, 2, 4, 8, 16, 16, 16, 16)[self.registers[bme280lib.REG_CONFIG] >> 2 & 0x07]
+
+  def _settle_steps(self):
+    # conversions after which an older one no longer shows in a 20-bit
+    # reading through the IIR filter, 1 with the filter off
+    coefficient = self._coefficient()
+    if not coefficient:
+      return 1
+    return int(math.ceil(20 * math.log(2) / -math.log(1 - 1.0 / coefficient)))
+
+  def _convert(self, when):
+    # latch a conversion of the environment at time when into the data
+    # registers
+    self.conversions += 1
+    ctrl_meas = self.registers[bme280lib.REG_CONTROL]
+    values = self.environment(when - self._start)
+    values = [value + self.random.gauss(0, sigma) if sigma else value
+              for value, sigma in zip(values, self.noise)]
+    pres_raw, temp_raw, hum_raw = self.raw_for(*values)
+    coefficient = self._coefficient()
+    if coefficient and self._filtered is not None:
+      old_pres, old_temp = self._filtered
+      pres_raw = (old_pres * (coefficient - 1) + pres_raw) // coefficient
+      temp_raw = (old_temp * (coefficient - 1) + temp_raw) // coefficient
+    self._filtered = (pres_raw, temp_raw)
+    if not ctrl_meas >> 5:
+      temp_raw = SKIPPED_20BIT
+    if not ctrl_meas >> 2 & 0x07:
+      pres_raw = SKIPPED_20BIT
+    if not self._ctrl_hum & 0x07:
+      hum_raw = SKIPPED_16BIT
+    self._store(pres_raw, temp_raw, hum_raw)
+
+  def _store(self, pres_raw, temp_raw, hum_raw):
+    regs = self.registers
+    reg = bme280lib.REG_DATA
+    regs[reg:reg+8] = bytearray([pres_raw >> 12, pres_raw >> 4 & 0xFF, (pres_raw & 0x0F) << 4,
+                                 temp_raw >> 12, temp_raw >> 4 & 0xFF, (temp_raw & 0x0F) << 4,
+                                 hum_raw >> 8, hum_raw & 0xFF])
+
+  def _update(self):
+    # run the conversions that finished by now
+    now = self.clock()
+    mode = self.registers[bme280lib.REG_CONTROL] & 0x03
+    if self._busy_until is not None and now >= self._busy_until:
+      self._convert(self._busy_until)
+      self._busy_until = None
+      if mode == bme280lib.MODE_FORCED:
+        self.registers[bme280lib.REG_CONTROL] &= 0xFC
+    if mode == bme280lib.MODE_NORMAL:
+      standby = (0.5, 62.5, 125, 250, 500, 1000, 10, 20)[self.registers[bme280lib.REG_CONFIG] >> 5]
+      period = self._conversion_time() + standby / 1000.0
+      if self._next_conversion <= now:
+        # after a long idle only the last conversions can still show in
+        # the data registers, the grid slots before them are skipped
+        due = int((now - self._next_conversion) // period) + 1
+        self._next_conversion += max(0, due - self._settle_steps()) * period
+      while self._next_conversion <= now:
+        self._convert(self._next_conversion)
+        self._next_conversion += period
+    # status: measuring bit while a conversion runs
+    self.registers[REG_STATUS] = 0x08 if self._busy_until is not None else 0
+
+  def read(self, reg, length):
+    self._update()
+    return list(self.registers[reg:reg+length])
+
+  def write(self, reg, value):
+    self._update()
+    if reg == bme280lib.REG_RESET:
+      if value == bme280lib.SOFT_RESET:
+        self.soft_reset()
+      return
+    if reg not in (bme280lib.REG_CONTROL_HUM, bme280lib.REG_CONTROL, bme280lib.REG_CONFIG):
+      # calibration and data registers are read only
+      return
+    self.registers[reg] = value
+    if reg == bme280lib.REG_CONTROL:
+      # ctrl_hum only takes effect after a write to ctrl_meas - page 26
+      self._ctrl_hum = self.registers[bme280lib.REG_CONTROL_HUM]
+      mode = value & 0x03
+      now = self.clock()
+      if mode == bme280lib.MODE_FORCED or mode == 2:
+        self._busy_until = now + self._conversion_time()
+        self._next_conversion = None
+      elif mode == bme280lib.MODE_NORMAL:
+        self._busy_until = None
+        self._next_conversion = now + self._conversion_time()
+      else:
+        self._busy_until = None
+        self._next_conversion = None
+
+# An I2C bus with simulated devices on it, with the smbus methods
+# bme280lib uses. Every transaction waits latency seconds plus up to
+# jitter more, and fails with a NACK (OSError EREMOTEIO, as smbus
+# raises) with probability nack_rate or when no device has the address.
+class SimulatedBus(object):
+
+  def __init__(self, latency=0.0, jitter=0.0, nack_rate=0.0, seed=None, sleep=time.sleep):
+    self.latency = latency
+    self.jitter = jitter
+    self.nack_rate = nack_rate
+    self.random = random.Random(seed)
+    self.sleep = sleep
+    self.devices = {}
+    self._lock = threading.Lock()
+    self.transactions = 0
+    self.nacks = 0
+    self.bytes_read = 0
+    self.bytes_written = 0
+
+  def add(self, device, addr=None):
+    # attach a device, at its own address unless addr is given
+    self.devices[device.addr if addr is None else addr] = device
+    return device
+
+  def stats(self):
+    with self._lock:
+      return {'transactions': self.transactions, 'nacks': self.nacks,
+              'bytes_read': self.bytes_read, 'bytes_written': self.bytes_written}
+
+  def _transaction(self, addr):
+    # one bus transaction, returns the device or raises the NACK
+    with self._lock:
+      self.transactions += 1
+      delay = self.latency
+      if self.jitter:
+        delay += self.random.uniform(0, self.jitter)
+      nack = addr not in self.devices or (self.nack_rate and self.random.random() < self.nack_rate)
+      if nack:
+        self.nacks += 1
+    if delay:
+      self.sleep(delay)
+    if nack:
+      raise OSError(errno.EREMOTEIO, 'Remote I/O error')
+    return self.devices[addr]
+
+  def read_i2c_block_data(self, addr, reg, length=32):
+    data = self._transaction(addr).read(reg, length)
+    with self._lock:
+      self.bytes_read += length
+    return data
+
+  def read_byte_data(self, addr, reg):
+    return self.read_i2c_block_data(addr, reg, 1)[0]
+
+  def write_byte_data(self, addr, reg, value):
+    self._transaction(addr).write(reg, value)
+    with self._lock:
+      self.bytes_written += 1
+
+  def write_i2c_block_data(self, addr, reg, data):
+    # the BME280 takes multi-byte writes as register, value pairs with
+    # the first register given by reg
+    device = self._transaction(addr)
+    device.write(reg, data[0])
+    for i in range(1, len(data) - 1, 2):
+      device.write(data[i], data[i+1])
+    with self._lock:
+      self.bytes_written += len(data)
@@ -17,157 +17,105 @@
 ########################################################################
 
 # General Python modules to import
-import time
-import subprocess
-from datetime import datetime
+import os
+import sys
+import importlib
 
-########################################################################
-# Importing Adrafruit modules for GPIO and SSD1306 OLED display
-# The adafruit libraries must be cloned from Adafruit repositories
-# and installed as part of circuitPython 
-# example, it is suggested to check the internetmachine for current repos
-# sudo apt-get update
-# sudo apt-get install build-essential python-pip python-dev python-smbus git
-# git clone https://github.com/adafruit/Adafruit_Python_GPIO.git
-# cd Adafruit_Python_GPIO
-# sudo python3 setup.py install
-########################################################################
-import Adafruit_GPIO.SPI as SPI
-import Adafruit_SSD1306
-from PIL import Image
-from PIL import ImageDraw
-from PIL import ImageFont
-
-# pyfirmata is used to interface with an Arduino running the StandardFirmata image
-import pyfirmata
 # import the bme280lib.py module
 import bme280lib
+# acqlib module, reads the sensors once and feeds every sink
+import acqlib
+# historylib module, keeps the readings in ring buffers on disk
+import historylib
+# soillib module, the soil moisture beds
+import soillib
 
 # determine the soil moisture sensors range for sand and mud
 # replace the values below with the recorded values
 sand = 0.51
 mud = 0.26
 
-# Initialize Arduino communications
-def init_firmata():
-  arduino = pyfirmata.Arduino('/dev/ttyACM0')
-  print("Communication Successfully started")
-  it = pyfirmata.util.Iterator(arduino)
-  it.start()
-  #configure analog input, A0, for reading moisture sensor
-  global soilmoisture
-  soilmoisture = arduino.analog[0]
-  soilmoisture.enable_reporting()
-  # the first read of the sensor returns the NoneType, 'None'
-  print(soilmoisture.read())
-  time.sleep(1)  
-
-# Initialize the SSD1306 display
-def init_ssd1306():
-  RST = 0
-  global disp
-  disp = Adafruit_SSD1306.SSD1306_128_64(rst=RST)
-  disp.begin()
-  disp.clear()
-  disp.display()
-
-  global width
-  width = disp.width
-  global height
-  height = disp.height
-  global image
-  image = Image.new('1', (width, height))
-  global draw
-  draw = ImageDraw.Draw(image)
-  draw.rectangle((0,0,width,height), outline=0, fill=0)
-
-  global font
-  font = ImageFont.load_default()
+# the soil moisture beds: Arduino analog pin, name, the sensor's sand
+# and mud readings and the dry/wet thresholds in %. The first bed is
+# the one shown on the display and sent to the uplinks, e.g. add
+# soillib.SoilChannel(1, 'bed2', 0.50, 0.27, dry=35, wet=75)
+# A bed can be read at its own interval instead of SOIL_INTERVAL, e.g.
+# soillib.SoilChannel(2, 'bed3', interval=60)
+SOIL_CHANNELS = [
+  soillib.SoilChannel(0, 'soil', sand, mud),
+]
+
+# sampling and display intervals in seconds, each runs on its own
+BME280_INTERVAL = 60
+SOIL_INTERVAL = 10
+PAGE_INTERVAL = 30
+
+# uplinks send a value once it moved by more than its deadband, and at
+# least every REPORT_HEARTBEAT seconds while it holds steady
+REPORT_HEARTBEAT = 15 * 60
+DEADBANDS = {
+  'bme280.temperature': 0.2,  # C
+  'bme280.humidity': 1.0,     # %
+  'bme280.pressure': 0.5,     # hPa
+}
+for channel in SOIL_CHANNELS:
+  DEADBANDS[channel.name + '.raw'] = 0.005
+  DEADBANDS[channel.name + '.moisture'] = 2.0  # %
+
+# history of the readings, kept in fixed-size files in HISTORY_DIR
+HISTORY_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'history')
+HISTORY_FIELDS = ['bme280.temperature', 'bme280.pressure', 'bme280.humidity']
+for channel in SOIL_CHANNELS:
+  HISTORY_FIELDS += [channel.name + '.raw', channel.name + '.moisture']
+
+# set up the sensors, the terminal output and the local display.
+# disp and soil_pins default to the SSD1306 and the Arduino's analog
+# pins of SOIL_CHANNELS, no history is kept when history_dir is None
+def build(disp=None, soil_pins=None, history_dir=HISTORY_DIR):
+  acq = acqlib.Acquisition()
+  if soil_pins is None:
+    #initialize arduino communication
+    soil_pins = acqlib.init_firmata(pins=[channel.pin for channel in SOIL_CHANNELS])
+  if disp is None:
+    #init_ssd1306 display
+    disp = acqlib.init_ssd1306()
   # print chip info to terminal
   (chip_id, chip_version) = bme280lib.readBME280ID()
   print ("Chip ID     : ", chip_id)
   print ("Version     : ", chip_version)
-  
-# what is the quality of the soil moisture
-def qualitySoilMoisture (smp):
-    retVal = ""
-    if int(smp) < 40:
-        retVal = "dry"
-    elif smp >= 40 and smp < 80:
-        retVal = "wet"
-    else:
-        retVal = "mud"
-    return retVal
-  
-# definition of the main() routine
-def main():
 
-  #initialize arduino communication
-  init_firmata()
-  #init_ssd1306 display
-  init_ssd1306()  
-  padding = -2
-  top = padding
-  bottom = height-padding
-  x = 0
+  acq.add_source(acqlib.BME280Source(BME280_INTERVAL))
+  for source in soillib.scan_sources(SOIL_CHANNELS, soil_pins, SOIL_INTERVAL):
+    acq.add_source(source)
+  acq.add_sink(acqlib.ConsoleSink())
+  acq.add_sink(acqlib.OLEDSink(disp, PAGE_INTERVAL))
+  if history_dir is not None:
+    acq.add_sink(historylib.HistorySink(historylib.History(history_dir, HISTORY_FIELDS)))
+  return acq
+
+# a report filter for an uplink, each keeps track of what it has sent
+def report_filter():
+  rules = dict((path, acqlib.Deadband(band, heartbeat=REPORT_HEARTBEAT))
+               for path, band in DEADBANDS.items())
+  return acqlib.ReportFilter(rules, acqlib.Deadband(heartbeat=REPORT_HEARTBEAT))
 
-  # this loop will run until ctrl-c is pressed
-  while True:
-    # setup oled display
-    draw.rectangle((0,0,width,height), outline=0, fill=0)
-    disp.clear()
-    disp.display()
-    # get the current datetime
-    # Converting datetime object to string
-    dateTimeObj = datetime.now()
-    timestampStr = dateTimeObj.strftime("%d-%b-%Y %H:%M:%S")
-    print('Current Time  : ', timestampStr)
-    # read the BME280 data
-    temperature,pressure,humidity = bme280lib.readBME280All()
-    # print BME280 data to terminal
-    print("Temperature   : ", round(temperature,2), "C")
-    print("Pressure      : ", round(pressure,2), "hPa")
-    print("Humidity      : ", round(humidity,2), "%")
-
-    # Write text to oled display.
-    draw.text((x+4, top+4),       "Forging Our Futures" ,  font=font, fill=255)
-    draw.text((x, top+16),       "Temperature : " + str(round(temperature,1)) + "C",  font=font, fill=255)
-    draw.text((x, top+28),       "Humidity : " + str(round(humidity,1)) + "%",  font=font, fill=255)
-    draw.text((x, top+40),       "Pressure : " + str(round(pressure,1)) + "hPa",  font=font, fill=255)
-    draw.text((x+4, top+56),     timestampStr, font=font, fill=255)
-    #draw.text((x+12, top+56),     "the Future Forge", font=font, fill=255)
-
-    # Display image and wait for a couple of seconds before reading again.
-    disp.image(image)
-    disp.display()
-    time.sleep(30)
-    
-    # setup oled display
-    draw.rectangle((0,0,width,height), outline=0, fill=0)
-    disp.clear()
-    disp.display()
-    # Read and display soil moisture sensor
-    sm = soilmoisture.read()
-    smp = round((sand - float(sm)),2)*(100/(sand - mud))
-    qsm = qualitySoilMoisture(smp) 
-    print("Soil Moisture : ", smp, "%")
-    print("Analog Raw    : ", sm)
-    print("Quality       : ", qsm)
-    
-    # Write text to oled display.
-    draw.text((x+4, top+4),       "Forging Our Futures" ,  font=font, fill=255)
-    draw.text((x, top+16),       "Soil Moisture : " + str(smp) + "%",  font=font, fill=255)
-    draw.text((x, top+28),       "Analog Raw    : " + str(sm),  font=font, fill=255)
-    draw.text((x, top+40),       "Quality       : " + qsm,  font=font, fill=255)
-    draw.text((x+4, top+56),     timestampStr, font=font, fill=255)
-    #draw.text((x+12, top+56),     "the Future Forge", font=font, fill=255)
-
-    # Display image and wait for a couple of seconds before reading again.
-    disp.image(image)
-    disp.display()
-    time.sleep(30)
+# definition of the main() routine
+# uplinks are named on the command line and all share the same sensor
+# reads, e.g. python3 gardener.py cayenne blynk adds the sinks() of
+# gardener_cayenne.py and gardener_blynk.py. sinks are added as well.
+def main(uplinks=None, sinks=()):
+  if uplinks is None:
+    uplinks = sys.argv[1:]
+  acq = build()
+  for sink in sinks:
+    acq.add_sink(sink)
+  for name in uplinks:
+    module = importlib.import_module('gardener_' + name)
+    for sink in module.sinks():
+      acq.add_sink(sink)
+
+  # this will run until ctrl-c is pressed
+  acq.run()
 
 if __name__=="__main__":
    main()
-
-
@@ -17,34 +17,15 @@
 ########################################################################
 
 # General Python modules to import
-import time
-import subprocess
-from datetime import datetime
+import os
 import sys
-import logging
-
-########################################################################
-# Adrafruit modules for GPIO and SSD1306 OLED display
-# The adafruit libraries must be cloned from Adafruit repositories
-# and installed as part of circuitPython 
-# example, it is suggested to check the internetmachine for current repos
-# sudo apt-get update
-# sudo apt-get install build-essential python-pip python-dev python-smbus git
-# git clone https://github.com/adafruit/Adafruit_Python_GPIO.git
-# cd Adafruit_Python_GPIO
-# sudo python3 setup.py install
-########################################################################
-import Adafruit_GPIO.SPI as SPI
-import Adafruit_SSD1306
-from PIL import Image
-from PIL import ImageDraw
-from PIL import ImageFont
-
-# pyfirmata is used to interface with an Arduino running the StandardFirmata image
-import pyfirmata
-# bme280lib module for temperature, humidity, pressure sensor
-import bme280lib
 
+# gardener module, the sensors and local display shared by every uplink
+import gardener
+# acqlib module, reads the sensors once and feeds every sink
+import acqlib
+# spoollib module, keeps readings on disk until they are sent
+import spoollib
 
 # module for Cayenne client interface
 import cayenne.client
@@ -56,147 +37,44 @@ MQTT_CLIENT_ID = "91da8630-7dcc-11eb-b767-3f1a8f1211ba"
 client = cayenne.client.CayenneMQTTClient()
 client.begin(MQTT_USERNAME, MQTT_PASSWORD, MQTT_CLIENT_ID)
 
-# determine the soil moisture sensors range for sand and mud
-# replace the values below with the recorded values
-sand = 0.51
-mud = 0.26
-
-# Initialize Arduino communications
-def init_firmata():
-  arduino = pyfirmata.Arduino('/dev/ttyACM0')
-  print("Communication Successfully started")
-  it = pyfirmata.util.Iterator(arduino)
-  it.start()
-  #configure analog input, A0, for reading moisture sensor
-  global soilmoisture
-  soilmoisture = arduino.analog[0]
-  soilmoisture.enable_reporting()
-  # the first read of the sensor returns the NoneType, 'None'
-  print(soilmoisture.read())
-  time.sleep(1)  
+# checking the data for Cayenne every PUBLISH_INTERVAL seconds, values
+# are sent when they changed (see gardener.DEADBANDS)
+# (we are not publishing everything)
+PUBLISH_INTERVAL = 10
+
+# readings are kept on disk until Cayenne has them, so they are not lost
+# in an outage. Up to SPOOL_MESSAGES are kept, the oldest go first.
+# Cayenne messages carry no time, so readings sent after an outage are
+# stamped when they arrive and bunch up there; the local history
+# (gardener_query.py) keeps their real times.
+SPOOL_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'gardener_cayenne.spool')
+SPOOL_MESSAGES = 50000
+
+# send a spooled message through the client's MQTT connection, its mid
+# once the client has taken it
+def forward(topic, payload, qos, retain):
+  if not client.connected:
+    return None
+  info = client.client.publish(topic, payload, qos, retain)
+  if info.rc != 0:
+    return None
+  return info.mid
+
+# the Cayenne sinks, for gardener.py cayenne
+def sinks():
+  spool = spoollib.Spool(SPOOL_PATH, max_messages=SPOOL_MESSAGES)
+  forwarder = spoollib.ForwardSink(spool, forward, lambda: client.connected, name='cayenne_forward')
+  # spooled messages are removed once the broker confirmed them
+  client.client.on_publish = forwarder.on_publish
+  return [acqlib.CayenneSink(client, [(1, 'celsiusWrite', 'bme280.temperature'),
+                                      (3, 'hectoPascalWrite', 'bme280.pressure')],
+                             PUBLISH_INTERVAL, spool=spool, report=gardener.report_filter()),
+          forwarder]
 
-# Initialize the SSD1306 display
-def init_ssd1306():
-  RST = 0
-  global disp
-  disp = Adafruit_SSD1306.SSD1306_128_64(rst=RST)
-  disp.begin()
-  disp.clear()
-  disp.display()
-
-  global width
-  width = disp.width
-  global height
-  height = disp.height
-  global image
-  image = Image.new('1', (width, height))
-  global draw
-  draw = ImageDraw.Draw(image)
-  draw.rectangle((0,0,width,height), outline=0, fill=0)
-
-  global font
-  font = ImageFont.load_default()
-  # print chip info to terminal
-  (chip_id, chip_version) = bme280lib.readBME280ID()
-  print ("Chip ID     : ", chip_id)
-  print ("Version     : ", chip_version)
-  
-# what is the quality of the soil moisture
-def qualitySoilMoisture (smp):
-    retVal = ""
-    if int(smp) < 40:
-        retVal = "dry"
-    elif smp >= 40 and smp < 80:
-        retVal = "wet"
-    else:
-        retVal = "mud"
-    return retVal
-  
 # definition of the main() routine
 def main():
-
-  #initialize arduino communication
-  init_firmata()
-  #init_ssd1306 display
-  init_ssd1306()  
-  padding = -2
-  top = padding
-  bottom = height-padding
-  x = 0
-  # data refresh rate
-  refreshTime = 15
-  i=0
-  timestamp = 0
-
-  # this loop will run until ctrl-c is pressed
-  while True:
-    # setup oled display
-    draw.rectangle((0,0,width,height), outline=0, fill=0)
-    disp.clear()
-    disp.display()
-    # get the current datetime
-    # Converting datetime object to string
-    dateTimeObj = datetime.now()
-    timestampStr = dateTimeObj.strftime("%d-%b-%Y %H:%M:%S")
-    print('Current Time  : ', timestampStr)
-    # read the BME280 data
-    tempC,pressure,humidity = bme280lib.readBME280All()
-    # print BME280 data to terminal
-    print("Temperature   : ", round(tempC,2), "C")
-    print("Pressure      : ", round(pressure,2), "hPa")
-    print("Humidity      : ", round(humidity,2), "%")
-    # Read and display soil moisture sensor
-    sm = soilmoisture.read()
-    smp = round((sand - float(sm)),2)*(100/(sand - mud))
-    qsm = qualitySoilMoisture(smp) 
-    print("Soil Moisture : ", smp, "%")
-    print("Analog Raw    : ", sm)
-    print("Quality       : ", qsm)
-
-    # Write text to oled display.
-    draw.text((x+4, top+4),      "Forging Our Futures" ,  font=font, fill=255)
-    draw.text((x, top+16),       "Temperature : " + str(round(tempC,1)) + "C",  font=font, fill=255)
-    draw.text((x, top+28),       "Humidity : " + str(round(humidity,1)) + "%",  font=font, fill=255)
-    draw.text((x, top+40),       "Pressure : " + str(round(pressure,1)) + "hPa",  font=font, fill=255)
-    draw.text((x+4, top+56),     timestampStr, font=font, fill=255)
-    #draw.text((x+12, top+56),     "the Future Forge", font=font, fill=255)
-
-    # Display image and wait for a couple of seconds before reading again.
-    disp.image(image)
-    disp.display()
-
-    #publishing data to Cayenne (we are not publishing everything)
-    client.loop()
-    
-    if (time.time() > timestamp + 10):
-        client.celsiusWrite(1, tempC)
-        client.hectoPascalWrite(3, pressure)
-        timestamp = time.time()
-        i = i+1
-
-
-    time.sleep(refreshTime)
-    
-    # setup oled display
-    draw.rectangle((0,0,width,height), outline=0, fill=0)
-    disp.clear()
-    disp.display()
-    
-    # Write text to oled display.
-    draw.text((x+4, top+4),       "Forging Our Futures" ,  font=font, fill=255)
-    draw.text((x, top+16),       "Soil Moisture : " + str(smp) + "%",  font=font, fill=255)
-    draw.text((x, top+28),       "Analog Raw    : " + str(sm),  font=font, fill=255)
-    draw.text((x, top+40),       "Quality       : " + qsm,  font=font, fill=255)
-    draw.text((x+4, top+56),     timestampStr, font=font, fill=255)
-    #draw.text((x+12, top+56),     "the Future Forge", font=font, fill=255)
-
-    # Display image and wait for a couple of seconds before reading again.
-    disp.image(image)
-    disp.display()
-
-    time.sleep(refreshTime)
+  # further uplinks may be named on the command line
+  gardener.main(sys.argv[1:], sinks())
 
 if __name__=="__main__":
    main()
-
-
@@ -0,0 +1,73 @@
+########################################################################
+# Raspberry Pi Greenhouse Controller
+# Query the history the gardener keeps of its readings, e.g. the soil
+# moisture over the last 48 hours, an hour at a time:
+#   python3 gardener_query.py soil.moisture --last 48h --resolution 1h
+# Rows are written to the terminal as CSV, or as JSON lines with
+# --format json, while the gardener keeps running.
+########################################################################
+
+# General Python modules to import
+import argparse
+import sys
+
+# gardener module, for where the history is kept
+import gardener
+# acqlib module, for the timestamps shown
+import acqlib
+# historylib and querylib modules, the history and its queries
+import historylib
+import querylib
+
+# definition of the main() routine
+def main(argv=None):
+  parser = argparse.ArgumentParser(description='Query the history of the gardener readings.')
+  parser.add_argument('fields', nargs='*',
+                      help='values to show, e.g. soil.moisture (default all)')
+  parser.add_argument('--last', default='24h',
+                      help='show this far back from the end, e.g. 90m, 48h, 7d (default %(default)s)')
+  parser.add_argument('--start', help='first time to show, seconds since the epoch or ISO local time')
+  parser.add_argument('--end', default='now', help='show up to this time (default %(default)s)')
+  parser.add_argument('--resolution',
+                      help='buckets of min/mean/max this long, e.g. 10m, 1h, 1d (default the samples)')
+  parser.add_argument('--format', choices=sorted(querylib.WRITERS), default='csv')
+  parser.add_argument('--dir', default=gardener.HISTORY_DIR,
+                      help='history directory (default %(default)s)')
+  parser.add_argument('--list', action='store_true', help='list the fields and tiers and exit')
+  args = parser.parse_args(argv)
+
+  try:
+    history = historylib.History(args.dir, readonly=True)
+  except (OSError, ValueError) as e:
+    print('no history in {0}: {1}'.format(args.dir, e), file=sys.stderr)
+    return 1
+  if args.list:
+    for name in ['raw'] + [name for name, width, ring in history.tiers]:
+      ring = history.tier(name)
+      span = ''
+      if len(ring):
+        span = ' {0} to {1}'.format(acqlib.timestamp_str(ring[0][0]), acqlib.timestamp_str(ring[-1][0]))
+      print('{0:4} {1:7} records{2}'.format(name, len(ring), span))
+    for field in history.fields:
+      print(field)
+    return 0
+
+  fields = args.fields or history.fields
+  end = querylib.parse_time(args.end)
+  if args.start:
+    start = querylib.parse_time(args.start)
+  else:
+    start = end - querylib.parse_duration(args.last)
+  resolution = None
+  if args.resolution:
+    resolution = querylib.parse_duration(args.resolution)
+  try:
+    rows = querylib.rows(history, fields, start, end, resolution)
+  except (KeyError, ValueError) as e:
+    print(e.args[0], file=sys.stderr)
+    return 2
+  querylib.WRITERS[args.format](sys.stdout, querylib.columns(fields, resolution), rows)
+  return 0
+
+if __name__=="__main__":
+  sys.exit(main())
@@ -0,0 +1,366 @@
+# Module for keeping the history of the readings
+# Samples go into fixed-size ring buffers in memory-mapped files, so the
+# files never grow, recent data is there again after a restart without
+# parsing anything, and the 1 minute, 1 hour and 1 day tiers keep the
+# min/mean/max of the older data at a fraction of the size
+
+import logging
+import math
+import mmap
+import os
+import struct
+import threading
+
+import acqlib
+
+log = logging.getLogger('historylib')
+
+MAGIC = b'GDNRING1'
+# magic, record size, capacity, number of values, records written
+_HEADER = struct.Struct('<8sIIIQ')
+# the header page also holds the value names, newline separated
+HEADER_SIZE = 4096
+# records per block of the time index
+BLOCK = 256
+_TIME = struct.Struct('<d')
+
+def _read_header(path):
+  # magic, record size, capacity and value names of a ring file
+  with open(path, 'rb') as f:
+    header = f.read(HEADER_SIZE)
+  if len(header) < _HEADER.size + 2:
+    return None, 0, 0, []
+  magic, record_size, capacity, count, written = _HEADER.unpack_from(header)
+  length, = struct.unpack_from('<H', header, _HEADER.size)
+  names = header[_HEADER.size + 2:_HEADER.size + 2 + length].decode('utf-8', 'replace')
+  return magic, record_size, capacity, names.split('\n') if names else []
+
+# A ring of capacity records, each a time (seconds, double) and a fixed
+# list of named float values, NaN where there is no value. Once full the
+# oldest record is overwritten. The record is written before the count
+# in the header, so a crash part way loses at most that record.
+# A sparse time index keeps the lowest and highest time of each block of
+# BLOCK slots, so range() only reads the blocks that can hold a match,
+# whether or not the clock ever went back.
+# A readonly ring, e.g. for queries while the gardener is running, takes
+# its names and capacity from the file when they are not given.
+class Ring(object):
+
+  def __init__(self, path, names=None, capacity=None, readonly=False):
+    self.path = path
+    if readonly:
+      magic, record_size, file_capacity, file_names = _read_header(path)
+      if magic != MAGIC:
+        raise ValueError('{0} is not a history ring'.format(path))
+      if names is None:
+        names = file_names
+      if capacity is None:
+        capacity = file_capacity
+    self.names = list(names)
+    self.capacity = capacity
+    self.readonly = readonly
+    self.record = struct.Struct('<d{0}f'.format(len(self.names)))
+    if _HEADER.size + 2 + len('\n'.join(self.names).encode('utf-8')) > HEADER_SIZE:
+      raise ValueError('too many value names for the header')
+    self._lock = threading.Lock()
+    size = HEADER_SIZE + capacity * self.record.size
+    matches = os.path.exists(path) and self._matches(path, size)
+    if readonly:
+      if not matches:
+        raise ValueError('{0} does not hold these values'.format(path))
+      self._file = open(path, 'rb')
+      self._map = mmap.mmap(self._file.fileno(), size, access=mmap.ACCESS_READ)
+    else:
+      if os.path.exists(path) and not matches:
+        # other values or capacity, keep the old file aside and start over
+        log.warning('%s has another layout, moved to %s.old', path, path)
+        os.replace(path, path + '.old')
+      fresh = not os.path.exists(path)
+      self._file = open(path, 'w+b' if fresh else 'r+b')
+      if fresh:
+        self._file.truncate(size)
+      self._map = mmap.mmap(self._file.fileno(), size)
+      if fresh:
+        names_data = '\n'.join(self.names).encode('utf-8')
+        self._write_header(0)
+        self._map[_HEADER.size:_HEADER.size + 2] = struct.pack('<H', len(names_data))
+        self._map[_HEADER.size + 2:_HEADER.size + 2 + len(names_data)] = names_data
+        self._map.flush()
+    self.written = _HEADER.unpack_from(self._map)[4]
+    self._index = [None] * ((capacity + BLOCK - 1) // BLOCK)
+    for k in range(len(self._index)):
+      self._index_block(k)
+
+  def _matches(self, path, size):
+    if os.path.getsize(path) != size:
+      return False
+    magic, record_size, capacity, names = _read_header(path)
+    return (magic == MAGIC and record_size == self.record.size
+            and capacity == self.capacity and names == self.names)
+
+  def _write_header(self, written):
+    _HEADER.pack_into(self._map, 0, MAGIC, self.record.size, self.capacity,
+                      len(self.names), written)
+
+  def __len__(self):
+    return min(self.written, self.capacity)
+
+  def _index_block(self, k):
+    # exact lowest and highest time of the written slots of block k
+    begin = k * BLOCK
+    end = min(begin + BLOCK, len(self))
+    size = self.record.size
+    times = [_TIME.unpack_from(self._map, HEADER_SIZE + slot * size)[0]
+             for slot in range(begin, end)]
+    self._index[k] = (min(times), max(times)) if times else None
+
+  def append(self, t, values):
+    # values in the order of names, None for no value
+    values = [math.nan if value is None else value for value in values]
+    with self._lock:
+      slot = self.written % self.capacity
+      self.record.pack_into(self._map, HEADER_SIZE + slot * self.record.size, t, *values)
+      self.written += 1
+      self._write_header(self.written)
+      k = slot // BLOCK
+      if slot % BLOCK == BLOCK - 1 or slot == self.capacity - 1:
+        # the block has been written through, index it afresh
+        self._index_block(k)
+      elif self._index[k] is None:
+        self._index[k] = (t, t)
+      else:
+        # still holds older records of the previous lap, widen the bounds
+        low, high = self._index[k]
+        self._index[k] = (min(low, t), max(high, t))
+
+  def _offset(self, i):
+    # file offset of the i-th oldest record
+    return HEADER_SIZE + ((self.written - len(self) + i) % self.capacity) * self.record.size
+
+  def __getitem__(self, i):
+    # the i-th oldest record as (time, values), -1 is the newest
+    with self._lock:
+      n = len(self)
+      if i < 0:
+        i += n
+      if not 0 <= i < n:
+        raise IndexError('record out of range')
+      record = self.record.unpack_from(self._map, self._offset(i))
+    return record[0], record[1:]
+
+  def records(self, start=0, stop=None):
+    # (time, values) of the records start to stop, oldest first, read
+    # straight from the mapping a contiguous run at a time
+    with self._lock:
+      n = len(self)
+      stop = n if stop is None else min(stop, n)
+      first = (self.written - n) % self.capacity
+      runs = []
+      i = start
+      while i < stop:
+        slot = (first + i) % self.capacity
+        count = min(stop - i, self.capacity - slot)
+        begin = HEADER_SIZE + slot * self.record.size
+        runs.append(bytes(self._map[begin:begin + count * self.record.size]))
+        i += count
+    for data in runs:
+      for record in self.record.iter_unpack(data):
+        yield record[0], record[1:]
+
+  def range(self, start, end):
+    # (time, values) of the records with start <= time < end, in the
+    # order they were written
+    with self._lock:
+      n = len(self)
+      first = (self.written - n) % self.capacity
+      if self.written > self.capacity:
+        segments = [(first, self.capacity), (0, first)]
+      else:
+        segments = [(0, n)]
+      size = self.record.size
+      runs = []
+      for begin, end_slot in segments:
+        slot = begin
+        while slot < end_slot:
+          k = slot // BLOCK
+          stop = min((k + 1) * BLOCK, end_slot)
+          bounds = self._index[k]
+          if bounds is not None and bounds[0] < end and bounds[1] >= start:
+            if runs and runs[-1][1] == slot:
+              # extend the previous run, read in one piece
+              runs[-1][1] = stop
+            else:
+              runs.append([slot, stop])
+          slot = stop
+      data = [bytes(self._map[HEADER_SIZE + a * size:HEADER_SIZE + b * size]) for a, b in runs]
+    for chunk in data:
+      for record in self.record.iter_unpack(chunk):
+        if start <= record[0] < end:
+          yield record[0], record[1:]
+
+  def flush(self):
+    # write the dirty pages to the file now
+    with self._lock:
+      if not self.readonly:
+        self._map.flush()
+
+  def close(self):
+    with self._lock:
+      if not self.readonly:
+        self._map.flush()
+      self._map.close()
+      self._file.close()
+
+# running min, sum, max and count of the values of one bucket
+class Bucket(object):
+
+  def __init__(self, start, size):
+    self.start = start
+    self.min = [math.inf] * size
+    self.max = [-math.inf] * size
+    self.sum = [0.0] * size
+    self.count = [0] * size
+
+  def add(self, values):
+    for i, value in enumerate(values):
+      if value is None or value != value:
+        continue
+      if value < self.min[i]:
+        self.min[i] = value
+      if value > self.max[i]:
+        self.max[i] = value
+      self.sum[i] += value
+      self.count[i] += 1
+
+  def values(self):
+    # min, mean and max of each value, NaN without samples
+    values = []
+    for low, total, high, count in zip(self.min, self.sum, self.max, self.count):
+      if count:
+        values += [low, total / count, high]
+      else:
+        values += [math.nan] * 3
+    return values
+
+# tier name, bucket width in seconds and capacity in buckets: a week of
+# minutes, two years of hours and ten years of days
+TIERS = [('1m', 60, 7 * 24 * 60),
+         ('1h', 3600, 2 * 366 * 24),
+         ('1d', 86400, 10 * 366)]
+
+# Keeps the raw samples of fields, e.g. ['bme280.temperature',
+# 'soil.moisture'], in the ring raw.ring of directory, and rolls them up
+# into a ring per tier (1m.ring...) holding the min, mean and max of
+# each field per bucket. Buckets are aligned to the epoch (UTC days), a
+# bucket is written once a sample of a later bucket arrives. After a
+# restart the open buckets are rebuilt from the raw ring.
+# A readonly history reads the rings another process is writing, with
+# the fields and capacities found in the files; the buckets still open
+# in that process are not in its tiers yet (querylib rolls them up from
+# the raw ring).
+class History(object):
+
+  def __init__(self, directory, fields=None, raw_capacity=100000, tiers=TIERS, readonly=False):
+    self.directory = directory
+    self.readonly = readonly
+    if fields is None and not readonly:
+      raise ValueError('the fields of a new history are needed')
+    if not readonly and not os.path.isdir(directory):
+      os.makedirs(directory)
+    if readonly:
+      raw_capacity = None
+    self.raw = Ring(os.path.join(directory, 'raw.ring'), fields, raw_capacity, readonly)
+    self.fields = self.raw.names
+    self._index = dict((field, i) for i, field in enumerate(self.fields))
+    names = []
+    for field in self.fields:
+      names += [field + '.min', field + '.mean', field + '.max']
+    self.tiers = []
+    for name, width, capacity in tiers:
+      path = os.path.join(directory, name + '.ring')
+      if readonly:
+        if not os.path.exists(path):
+          continue
+        capacity = None
+      self.tiers.append((name, width, Ring(path, names, capacity, readonly)))
+    self._lock = threading.Lock()
+    self._buckets = [None] * len(self.tiers)
+    if not readonly:
+      self._recover()
+
+  def tier(self, name):
+    # the ring of a tier, 'raw' for the samples
+    if name == 'raw':
+      return self.raw
+    for tier_name, width, ring in self.tiers:
+      if tier_name == name:
+        return ring
+    raise KeyError(name)
+
+  def _recover(self):
+    # refold the raw samples after the last bucket written of each tier
+    if not len(self.raw):
+      return
+    since = []
+    for name, width, ring in self.tiers:
+      since.append(ring[-1][0] + width if len(ring) else -math.inf)
+    for t, values in self.raw.records():
+      self._roll(t, values, since)
+
+  def add(self, t, values):
+    # record a sample, values by field; other fields are left empty
+    row = [None] * len(self.fields)
+    for field, value in values.items():
+      i = self._index.get(field)
+      if i is not None and value is not None:
+        row[i] = float(value)
+    with self._lock:
+      self.raw.append(t, row)
+      self._roll(t, row)
+
+  def _roll(self, t, values, since=None):
+    for i, (name, width, ring) in enumerate(self.tiers):
+      if since is not None and t < since[i]:
+        continue
+      start = t // width * width
+      bucket = self._buckets[i]
+      if bucket is not None and start != bucket.start:
+        if start < bucket.start:
+          # the clock went back, leave the closed bucket alone
+          continue
+        ring.append(bucket.start, bucket.values())
+        bucket = None
+      if bucket is None:
+        bucket = self._buckets[i] = Bucket(start, len(self.fields))
+      bucket.add(values)
+
+  def flush(self):
+    self.raw.flush()
+    for name, width, ring in self.tiers:
+      ring.flush()
+
+  def close(self):
+    self.raw.close()
+    for name, width, ring in self.tiers:
+      ring.close()
+
+# Records every sample of its sources into a History. The pages are
+# written out every interval seconds; between flushes the kernel writes
+# them back as it sees fit, a few pages at a time as the rings advance.
+class HistorySink(acqlib.Sink):
+
+  def __init__(self, history, interval=300, name='history'):
+    acqlib.Sink.__init__(self, name, interval)
+    self.history = history
+
+  def handle(self, sample):
+    values = dict((sample.source + '.' + key, value)
+                  for key, value in sample.values.items()
+                  if isinstance(value, (int, float)))
+    self.history.add(sample.time, values)
+
+  def tick(self):
+    self.history.flush()
+
+  def stop(self):
+    self.history.flush()
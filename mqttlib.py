@@ -0,0 +1,177 @@
+# Module for publishing readings over MQTT
+# Coalesces the channels of a tick, and optionally several ticks, into
+# one compact JSON or CBOR message instead of one publish per value
+
+import json
+import logging
+import struct
+import threading
+
+import acqlib
+
+log = logging.getLogger('mqttlib')
+
+def encode_json(obj):
+  # JSON without the optional whitespace
+  return json.dumps(obj, separators=(',', ':'))
+
+def _cbor_head(major, n):
+  # CBOR initial byte and argument - RFC 8949 section 3
+  if n < 24:
+    return struct.pack('>B', major << 5 | n)
+  if n < 0x100:
+    return struct.pack('>BB', major << 5 | 24, n)
+  if n < 0x10000:
+    return struct.pack('>BH', major << 5 | 25, n)
+  if n < 0x100000000:
+    return struct.pack('>BI', major << 5 | 26, n)
+  return struct.pack('>BQ', major << 5 | 27, n)
+
+def encode_cbor(obj):
+  # CBOR for the types readings are made of: dict, list, str, int,
+  # float, bool and None. Floats use single precision when that keeps
+  # their value, double otherwise.
+  if obj is None:
+    return b'\xf6'
+  if obj is True:
+    return b'\xf5'
+  if obj is False:
+    return b'\xf4'
+  if isinstance(obj, int):
+    if obj >= 0:
+      return _cbor_head(0, obj)
+    return _cbor_head(1, -1 - obj)
+  if isinstance(obj, float):
+    single = struct.pack('>f', obj)
+    if struct.unpack('>f', single)[0] == obj:
+      return b'\xfa' + single
+    return b'\xfb' + struct.pack('>d', obj)
+  if isinstance(obj, str):
+    data = obj.encode('utf-8')
+    return _cbor_head(3, len(data)) + data
+  if isinstance(obj, bytes):
+    return _cbor_head(2, len(obj)) + obj
+  if isinstance(obj, (list, tuple)):
+    return _cbor_head(4, len(obj)) + b''.join(encode_cbor(item) for item in obj)
+  if isinstance(obj, dict):
+    return _cbor_head(5, len(obj)) + b''.join(encode_cbor(key) + encode_cbor(value)
+                                              for key, value in obj.items())
+  raise TypeError('cannot encode {0!r} as CBOR'.format(obj))
+
+ENCODERS = {'json': encode_json, 'cbor': encode_cbor}
+
+# A value to publish: path is the acquisition value ('bme280.pressure'),
+# key its name in the message. digits rounds the value to shorten the
+# message. Channels with the same qos and retain share a message.
+# type and unit are used by the Cayenne format.
+class Channel(object):
+  __slots__ = ('path', 'key', 'qos', 'retain', 'digits', 'type', 'unit')
+
+  def __init__(self, path, key, qos=0, retain=False, digits=None, type=None, unit=None):
+    self.path = path
+    self.key = key
+    self.qos = qos
+    self.retain = retain
+    self.digits = digits
+    self.type = type
+    self.unit = unit
+
+# Message layouts. A message holds a list of ticks, each a timestamp and
+# the (channel, value) pairs read at that tick.
+def compact_payload(ticks):
+  # {"ts": seconds, "v": {key: value}} per tick, a single tick is sent
+  # on its own and several as a list
+  entries = [{'ts': int(t), 'v': dict((channel.key, value) for channel, value in values)}
+             for t, values in ticks]
+  return entries[0] if len(entries) == 1 else entries
+
+def cayenne_payload(ticks):
+  # Cayenne's data/json topic takes the channels of one reading,
+  # [{"channel": 1, "value": 21.5, "type": "temp", "unit": "c"}, ...]
+  if len(ticks) != 1:
+    raise ValueError('the Cayenne format holds a single tick')
+  payload = []
+  for channel, value in ticks[0][1]:
+    entry = {'channel': channel.key, 'value': value}
+    if channel.type is not None:
+      entry['type'] = channel.type
+    if channel.unit is not None:
+      entry['unit'] = channel.unit
+    payload.append(entry)
+  return payload
+
+FORMATS = {'compact': compact_payload, 'cayenne': cayenne_payload}
+
+# Sink publishing the latest values of its channels every interval
+# seconds. With batch > 1 the ticks are kept and sent batch at a time,
+# the rest are sent when the sink stops. Each flush sends one message
+# per (qos, retain) group of channels to topic. With a report filter
+# (acqlib.ReportFilter) a tick only carries the channels it lets through,
+# judged on their path, and a tick without any is not sent. The payload
+# is keyed by each channel's key either way.
+class BatchMQTTSink(acqlib.Sink):
+
+  def __init__(self, mqttc, topic, channels, interval=30, batch=1,
+               encoding='json', format='compact', report=None, name='mqtt'):
+    acqlib.Sink.__init__(self, name, interval, report=report)
+    if encoding not in ENCODERS:
+      raise ValueError('encoding must be one of {0}'.format(sorted(ENCODERS)))
+    if format not in FORMATS:
+      raise ValueError('format must be one of {0}'.format(sorted(FORMATS)))
+    if format == 'cayenne' and (batch != 1 or encoding != 'json'):
+      raise ValueError('the Cayenne format is JSON with a batch of 1')
+    self.mqttc = mqttc
+    self.topic = topic
+    self.channels = channels
+    self.batch = batch
+    self.encode = ENCODERS[encoding]
+    self.payload = FORMATS[format]
+    self._ticks = []
+    self._lock = threading.Lock()
+    self.messages = 0
+    self.bytes = 0
+
+  def stats(self):
+    stats = acqlib.Sink.stats(self)
+    stats.update(messages=self.messages, bytes=self.bytes, pending=len(self._ticks))
+    return stats
+
+  def tick(self):
+    values = []
+    for channel in self.channels:
+      value = self.acq.get(channel.path)
+      if value is None:
+        continue
+      if channel.digits is not None:
+        value = round(value, channel.digits)
+      if self.reported(channel.path, value):
+        values.append((channel, value))
+    if not values:
+      return
+    with self._lock:
+      self._ticks.append((self.acq.clock(), values))
+      if len(self._ticks) < self.batch:
+        return
+      ticks = self._ticks
+      self._ticks = []
+    self.send(ticks)
+
+  def stop(self):
+    with self._lock:
+      ticks = self._ticks
+      self._ticks = []
+    if ticks:
+      self.send(ticks)
+
+  def send(self, ticks):
+    # one message per qos and retain group
+    groups = {}
+    for t, values in ticks:
+      for channel, value in values:
+        group = groups.setdefault((channel.qos, channel.retain), {})
+        group.setdefault(t, []).append((channel, value))
+    for (qos, retain), group in sorted(groups.items()):
+      payload = self.encode(self.payload(sorted(group.items(), key=lambda tick: tick[0])))
+      self.mqttc.publish(self.topic, payload=payload, qos=qos, retain=retain)
+      self.messages += 1
+      self.bytes += len(payload)
@@ -0,0 +1,488 @@
+# Module for the SSD1306 OLED display
+# Collection of utilities for getting frames onto the display without
+# holding up the sensor reads and network I/O of the gardener loops
+
+import collections
+import logging
+import threading
+
+from PIL import Image
+from PIL import ImageDraw
+
+log = logging.getLogger('oledlib')
+
+# Owns the display on a background thread. Producers hand frames to
+# submit(), which never blocks: frames wait in a small bounded queue and
+# the worker always shows the newest one, skipping any older frames it
+# finds queued behind it. Skipped frames are counted so it is visible
+# when the panel cannot keep up.
+# update() queues a function that draws straight into the driver's
+# buffer instead, e.g. Sparkline.push() adding one column. Updates are
+# never skipped and run in order with the frames, on the worker thread,
+# which calls display() once for everything it took from the queue so
+# only the changed bytes go out.
+class DisplayService(object):
+
+  def __init__(self, disp, depth=2):
+    self.disp = disp
+    self.depth = depth
+    # ('frame', image or None) and ('update', function), oldest first
+    self._queue = []
+    self._cond = threading.Condition()
+    self._thread = None
+    self._running = False
+    # frames handed to submit()
+    self.submitted = 0
+    # frames written to the display
+    self.displayed = 0
+    # frames the worker skipped because a newer one was already queued
+    self.coalesced = 0
+    # frames pushed out of the full queue by submit()
+    self.dropped = 0
+    # functions run for update()
+    self.updates = 0
+    # frames or updates that failed to reach the display
+    self.errors = 0
+
+  def start(self):
+    with self._cond:
+      if self._running:
+        return
+      self._running = True
+    self._thread = threading.Thread(target=self._run, name='oled-display')
+    self._thread.daemon = True
+    self._thread.start()
+
+  def stop(self, timeout=None):
+    # stop the worker once the frame it is writing is done, queued
+    # frames and updates are discarded
+    with self._cond:
+      self._running = False
+      self._cond.notify()
+    if self._thread is not None:
+      self._thread.join(timeout)
+      self._thread = None
+
+  def submit(self, frame):
+    # queue a mode '1' PIL image for display. The service owns the image
+    # from now on, so submit a copy if it is going to be drawn on again.
+    with self._cond:
+      frames = [i for i, (kind, item) in enumerate(self._queue) if kind == 'frame']
+      if len(frames) == self.depth:
+        del self._queue[frames[0]]
+        self.dropped += 1
+      self._queue.append(('frame', frame))
+      self.submitted += 1
+      self._cond.notify()
+
+  def update(self, fn):
+    # queue fn() to draw into the driver's buffer on the worker thread,
+    # the only thread that touches the display
+    with self._cond:
+      self._queue.append(('update', fn))
+      self._cond.notify()
+
+  def clear(self):
+    # queue a blank frame
+    self.submit(None)
+
+  def stats(self):
+    with self._cond:
+      return {'submitted': self.submitted, 'displayed': self.displayed,
+              'coalesced': self.coalesced, 'dropped': self.dropped,
+              'updates': self.updates, 'errors': self.errors,
+              'queued': len(self._queue)}
+
+  def _run(self):
+    while True:
+      with self._cond:
+        while self._running and not self._queue:
+          self._cond.wait()
+        if not self._running:
+          return
+        queue = self._queue
+        self._queue = []
+        frames = [i for i, (kind, item) in enumerate(queue) if kind == 'frame']
+        # a frame replaces the whole buffer, only the newest is drawn
+        last = frames[-1] if frames else None
+        skipped = max(len(frames) - 1, 0)
+        self.coalesced += skipped
+      if skipped:
+        log.warning('display falling behind: %d frames coalesced, %d dropped so far',
+                    self.coalesced, self.dropped)
+      try:
+        for i, (kind, item) in enumerate(queue):
+          if kind == 'update':
+            item()
+          elif i == last:
+            if item is None:
+              self.disp.clear()
+            else:
+              self.disp.image(item)
+        self.disp.display()
+      except Exception:
+        log.exception('failed to write frame to display')
+        with self._cond:
+          self.errors += 1
+      else:
+        with self._cond:
+          self.displayed += last is not None
+          self.updates += len(queue) - len(frames)
+
+# Off-screen double buffer. Each screen is drawn into the back buffer
+# returned by begin() and handed to show (for example
+# DisplayService.submit) in a single swap(), so the panel never shows a
+# blank or half drawn frame. show gets a copy of the finished frame, as
+# DisplayService may still be writing it out while the back buffer is
+# drawn on again.
+class Compositor(object):
+
+  def __init__(self, width, height, show):
+    self.width = width
+    self.height = height
+    self.show = show
+    self._buffers = [Image.new('1', (width, height)), Image.new('1', (width, height))]
+    self._draws = [ImageDraw.Draw(buffer) for buffer in self._buffers]
+    self._back = 0
+
+  def begin(self):
+    # clear the back buffer and return an ImageDraw for it
+    draw = self._draws[self._back]
+    draw.rectangle((0,0,self.width,self.height), outline=0, fill=0)
+    return draw
+
+  def swap(self):
+    # show the back buffer, the other buffer becomes the back buffer
+    frame = self._buffers[self._back]
+    self._back ^= 1
+    self.show(frame.copy())
+
+  def compose(self, image):
+    # copy a finished image, e.g. a ScreenTemplate's, into the back
+    # buffer and show it
+    self._buffers[self._back].paste(image)
+    self.swap()
+
+
+def text_length(font, text):
+  # advance width of text in pixels as drawn on a mode '1' image, which
+  # uses the font's hinted advances rather than the anti-aliased ones,
+  # for old and new Pillow versions
+  draw = ImageDraw.Draw(Image.new('1', (1, 1)))
+  if hasattr(draw, 'textlength'):
+    return draw.textlength(text, font=font)
+  return font.getsize(text)[0]
+
+# characters whose glyphs are rasterised up front, the digits and units
+# of the value fields
+GLYPH_CHARS = '0123456789.-: %ChPa'
+
+# Bitmaps of single characters, rasterised once per font. A glyph is
+# (bitmap, offset, advance): the bitmap holds the character's ink, which
+# starts offset pixels from the pen position and may reach into the
+# neighbouring characters, and advance is how far the pen moves on.
+# Spaces and other inkless characters have no bitmap.
+class GlyphCache(object):
+
+  def __init__(self, font, preload=GLYPH_CHARS):
+    self.font = font
+    if hasattr(font, 'getbbox'):
+      self.height = max(font.getbbox(chr(c))[3] for c in range(32, 127))
+    else:
+      self.height = font.getsize('Ag')[1]
+    self._margin = self.height
+    self._glyphs = {}
+    for ch in preload:
+      self.get(ch)
+
+  def get(self, ch):
+    glyph = self._glyphs.get(ch)
+    if glyph is None:
+      advance = int(round(text_length(self.font, ch)))
+      margin = self._margin
+      bitmap = Image.new('1', (advance + 2*margin, self.height))
+      # fonts clip ink hanging over the ends of the text, so pad the
+      # character with spaces to keep all of it
+      space = int(round(text_length(self.font, ' ')))
+      ImageDraw.Draw(bitmap).text((margin - space, 0), ' ' + ch + ' ', font=self.font, fill=255)
+      box = bitmap.getbbox()
+      if box is None:
+        glyph = (None, 0, advance)
+      else:
+        glyph = (bitmap.crop((box[0], 0, box[2], self.height)), box[0] - margin, advance)
+      self._glyphs[ch] = glyph
+    return glyph
+
+class _Field(object):
+  __slots__ = ('x', 'y', 'text', 'positions')
+
+  def __init__(self, x, y):
+    self.x = x
+    self.y = y
+    self.text = ''
+    self.positions = []
+
+# A screen whose static text is rasterised once. Values go into named
+# fields, and update() only clears and redraws the pixels around the
+# characters that changed (or moved), so the work per frame follows the
+# number of changed characters rather than the size of the screen.
+class ScreenTemplate(object):
+
+  def __init__(self, width, height, font, glyphs=None):
+    self.width = width
+    self.height = height
+    self.font = font
+    self.glyphs = GlyphCache(font) if glyphs is None else glyphs
+    self.image = Image.new('1', (width, height))
+    self._draw = ImageDraw.Draw(self.image)
+    self._fields = {}
+    self._labels = []
+
+  def label(self, xy, text):
+    # place static text, returns the x coordinate just after it
+    label = _Field(xy[0], xy[1])
+    self._labels.append(label)
+    self._update_field(label, text)
+    if not label.positions:
+      return label.x
+    return label.positions[-1] + self.glyphs.get(text[-1])[2]
+
+  def field(self, name, x, y):
+    # declare a value field starting at x, y
+    self._fields[name] = _Field(x, y)
+
+  def update(self, **values):
+    # set field texts, returns the number of characters redrawn
+    changed = 0
+    for name, text in values.items():
+      changed += self._update_field(self._fields[name], text)
+    return changed
+
+  def _update_field(self, field, text):
+    if text == field.text:
+      return 0
+    glyphs = self.glyphs
+    old_text = field.text
+    old_positions = field.positions
+    positions = []
+    x = field.x
+    for ch in text:
+      positions.append(x)
+      x += glyphs.get(ch)[2]
+    # columns covered by the ink of every old and new character that
+    # changed, these are cleared and redrawn
+    dirty = [self.width, 0]
+    def touch(ch, pos):
+      bitmap, offset, advance = glyphs.get(ch)
+      if bitmap is not None:
+        dirty[0] = min(dirty[0], pos + offset)
+        dirty[1] = max(dirty[1], pos + offset + bitmap.size[0])
+    changed = 0
+    for i, ch in enumerate(text):
+      if i < len(old_text) and old_text[i] == ch and old_positions[i] == positions[i]:
+        continue
+      changed += 1
+      touch(ch, positions[i])
+      if i < len(old_text):
+        touch(old_text[i], old_positions[i])
+    for i in range(len(text), len(old_text)):
+      touch(old_text[i], old_positions[i])
+    field.text = text
+    field.positions = positions
+    if dirty[0] < dirty[1]:
+      self._redraw(field.y, dirty[0], dirty[1])
+    return changed
+
+  def reference(self):
+    # the same texts drawn in one go with draw.text, which the image
+    # kept up by update() has to match pixel for pixel
+    image = Image.new('1', (self.width, self.height))
+    draw = ImageDraw.Draw(image)
+    for field in self._labels + list(self._fields.values()):
+      if field.text:
+        draw.text((field.x, field.y), field.text, font=self.font, fill=255)
+    return image
+
+  def mismatch(self):
+    # box of the pixels that differ from reference(), None if they match
+    from PIL import ImageChops
+    return ImageChops.difference(self.image, self.reference()).getbbox()
+
+  def _redraw(self, y, x0, x1):
+    # clear columns x0..x1-1 of the text line at y and draw back every
+    # character whose ink falls inside them
+    height = self.glyphs.height
+    self._draw.rectangle((x0, y, x1-1, y+height-1), outline=0, fill=0)
+    for field in self._labels + list(self._fields.values()):
+      if abs(field.y - y) >= height:
+        continue
+      for ch, pos in zip(field.text, field.positions):
+        bitmap, offset, advance = self.glyphs.get(ch)
+        if bitmap is None:
+          continue
+        left = pos + offset
+        right = left + bitmap.size[0]
+        if left < x1 and right > x0:
+          self.image.paste(255, (left, field.y, right, field.y+height), bitmap)
+
+# Trend graph of the last width readings, drawn straight into the
+# buffer of an SSD1306 driver (not through PIL): each push() shifts the
+# graph one column to the left and draws only the newest column, so the
+# following disp.display() sends just the columns that changed.
+class Sparkline(object):
+
+  def __init__(self, disp, x, y, width, height, low, high, bars=False):
+    self.disp = disp
+    self.x = x
+    self.y = y
+    self.width = width
+    self.height = height
+    self.low = low
+    self.high = high
+    self.bars = bars
+    self.values = collections.deque(maxlen=width)
+    # the row of each reading, None for no reading
+    self._rows = collections.deque(maxlen=width)
+
+  def _row(self, value):
+    # row of the buffer a value is plotted on, clamped to the graph
+    if self.high == self.low:
+      scaled = 0
+    else:
+      scaled = (value - self.low) * (self.height - 1) / float(self.high - self.low)
+    scaled = min(max(int(round(scaled)), 0), self.height - 1)
+    return self.y + self.height - 1 - scaled
+
+  def add(self, value):
+    # keep a reading without drawing it, e.g. while another page is on
+    # the display; redraw() shows it
+    self.values.append(value)
+    self._rows.append(None if value is None else self._row(value))
+
+  def push(self, value):
+    # add a reading and draw it in the rightmost column
+    last = self._rows[-1] if self._rows else None
+    self.add(value)
+    self.disp.scroll_left(self.x, self.y, self.width, self.height, 1)
+    self._draw_column(self.x + self.width - 1, self._rows[-1], last)
+
+  def redraw(self):
+    # draw the whole graph again from the kept readings, e.g. after the
+    # buffer was cleared, as one bitmap in the driver's page layout
+    width = self.width
+    pages = (self.height + 7) // 8
+    data = bytearray(pages * width)
+    col = width - len(self._rows)
+    last = None
+    for row in self._rows:
+      if row is not None:
+        first, end = self._span(row, last)
+        bits = ((1 << (end - first)) - 1) << (first - self.y)
+        for page in range(pages):
+          data[page*width + col] = (bits >> (page*8)) & 0xFF
+      last = row
+      col += 1
+    self.disp.blit(data, self.x, self.y, width, self.height)
+
+  def _span(self, row, last):
+    # first and end (exclusive) row of the column of a reading plotted
+    # on row, after one on row last
+    if self.bars:
+      return row, self.y + self.height
+    if last is None:
+      return row, row + 1
+    # join to the previous reading so steep changes stay connected
+    return min(row, last), max(row, last) + 1
+
+  def _draw_column(self, col, row, last):
+    if row is None:
+      return
+    first, end = self._span(row, last)
+    self.disp.vline(col, first, end - first)
+
+# layout of the gardener screens
+padding = -2
+top = padding
+x = 0
+
+def _reading(value, unit):
+  # value rounded for the display with its unit, -- when there is none
+  if value is None:
+    return "--"
+  return str(round(value,1)) + unit
+
+# environment page, readings from the BME280
+class EnvironmentScreen(ScreenTemplate):
+
+  def __init__(self, width, height, font, glyphs=None):
+    ScreenTemplate.__init__(self, width, height, font, glyphs)
+    self.label((x+4, top+4), "Forging Our Futures")
+    self.field('temperature', self.label((x, top+16), "Temperature : "), top+16)
+    self.field('humidity', self.label((x, top+28), "Humidity : "), top+28)
+    self.field('pressure', self.label((x, top+40), "Pressure : "), top+40)
+    self.field('time', x+4, top+56)
+    #self.label((x+12, top+56), "the Future Forge")
+
+  def show(self, timestampStr, temperature, humidity, pressure):
+    # a value the BME280 profile skips is None and shown as --
+    return self.update(temperature=_reading(temperature, "C"),
+                       humidity=_reading(humidity, "%"),
+                       pressure=_reading(pressure, "hPa"),
+                       time=timestampStr)
+
+# soil page, moisture percentage, raw analog value and quality
+class SoilScreen(ScreenTemplate):
+
+  def __init__(self, width, height, font, glyphs=None):
+    ScreenTemplate.__init__(self, width, height, font, glyphs)
+    self.label((x+4, top+4), "Forging Our Futures")
+    self.field('moisture', self.label((x, top+16), "Soil Moisture : "), top+16)
+    self.field('raw', self.label((x, top+28), "Analog Raw    : "), top+28)
+    self.field('quality', self.label((x, top+40), "Quality       : "), top+40)
+    self.field('time', x+4, top+56)
+    #self.label((x+12, top+56), "the Future Forge")
+
+  def show(self, timestampStr, smp, sm, qsm):
+    return self.update(moisture=str(smp) + "%", raw=str(sm),
+                       quality=qsm, time=timestampStr)
+
+# trend page, a sparkline of the recent readings of each value under its
+# label; two fit on the display. The labels and the time are the page's
+# image, the graphs are drawn into disp's buffer on top of it: show()
+# puts the page up and push() then only adds a column to a graph.
+# Both run where the display is written, e.g. as DisplayService updates.
+class TrendScreen(ScreenTemplate):
+
+  def __init__(self, width, height, font, trends, disp, glyphs=None):
+    # trends is a list of (label, low, high), the range plotted
+    ScreenTemplate.__init__(self, width, height, font, glyphs)
+    self.disp = disp
+    self.graphs = []
+    for i, (label, low, high) in enumerate(trends):
+      y = top + 4 + i*26
+      self.label((x+4, y), label)
+      self.graphs.append(Sparkline(disp, x, y+12, width, 12, low, high))
+    self.field('time', x+4, top+56)
+    # whether the page is on the display, the graphs are drawn only then
+    self.shown = False
+
+  def empty(self):
+    return not any(graph.values for graph in self.graphs)
+
+  def push(self, i, value):
+    # add a reading to the i-th graph
+    if self.shown:
+      self.graphs[i].push(value)
+    else:
+      self.graphs[i].add(value)
+
+  def show(self, frame):
+    # put the page up, frame is a copy of the image
+    self.disp.image(frame)
+    for graph in self.graphs:
+      graph.redraw()
+    self.shown = True
+
+  def hide(self):
+    # another page replaced it
+    self.shown = False
@@ -0,0 +1,185 @@
+# Module for querying the history of the readings
+# Time ranges are read through the rings' block index, from the coarsest
+# tier that still gives the resolution asked for, and come back as NumPy
+# arrays or as rows to stream out as CSV or JSON lines
+
+import csv
+import json
+import math
+import time
+from datetime import datetime
+
+import historylib
+
+# seconds per duration unit, e.g. '48h' or '10m'
+UNITS = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400, 'w': 604800}
+
+def parse_duration(text):
+  # '90', '90s', '10m', '48h', '7d' or '2w' in seconds
+  text = text.strip()
+  if text[-1:] in UNITS:
+    return float(text[:-1]) * UNITS[text[-1]]
+  return float(text)
+
+def parse_time(text):
+  # 'now', seconds since the epoch or a local ISO date and time, e.g.
+  # 2026-10-17 or 2026-10-17T06:30
+  if text == 'now':
+    return time.time()
+  try:
+    return float(text)
+  except ValueError:
+    return datetime.fromisoformat(text).timestamp()
+
+def select_tier(history, resolution=None):
+  # the coarsest tier whose buckets fit a whole number of times into
+  # resolution seconds, as (name, width), ('raw', None) for the samples
+  # themselves. A tier that does not divide the resolution would put a
+  # bucket's values into the wrong row, e.g. 90 s buckets come from the
+  # samples rather than the 1 minute tier.
+  name, width = 'raw', None
+  if resolution is None:
+    return name, width
+  if resolution <= 0:
+    raise ValueError('the resolution must be positive')
+  for tier_name, tier_width, ring in history.tiers:
+    if resolution % tier_width == 0 and (width is None or tier_width > width):
+      name, width = tier_name, tier_width
+  return name, width
+
+def columns(fields, resolution=None):
+  # the value columns of a query, after the time
+  if resolution is None:
+    return list(fields)
+  names = []
+  for field in fields:
+    names += [field + '.min', field + '.mean', field + '.max']
+  return names
+
+# min, mean and max of tier rows merged into a wider bucket, the mean
+# of the means as the tiers do not keep their counts
+class _Merge(object):
+
+  def __init__(self, start, size):
+    self.start = start
+    self.low = historylib.Bucket(start, size)
+    self.mean = historylib.Bucket(start, size)
+    self.high = historylib.Bucket(start, size)
+
+  def add(self, values):
+    self.low.add(values[0::3])
+    self.mean.add(values[1::3])
+    self.high.add(values[2::3])
+
+  def values(self):
+    low, mean, high = self.low.values(), self.mean.values(), self.high.values()
+    values = []
+    for i in range(0, len(low), 3):
+      values += [low[i], mean[i + 1], high[i + 2]]
+    return values
+
+def _select(ring, names):
+  # positions of names in the ring's records
+  missing = [name for name in names if name not in ring.names]
+  if missing:
+    raise KeyError('not in the history: {0}'.format(', '.join(missing)))
+  return [ring.names.index(name) for name in names]
+
+def rows(history, fields, start, end, resolution=None):
+  # (time, values) from start to end (seconds since the epoch) in the
+  # order of columns(fields, resolution). Without a resolution these are
+  # the samples that have any of the fields, with one they are buckets of
+  # resolution seconds holding the min, mean and max of each field.
+  # Empty buckets are left out. Unknown fields raise KeyError here,
+  # the rows are then read as they are consumed.
+  name, width = select_tier(history, resolution)
+  if name == 'raw':
+    positions = _select(history.raw, fields)
+    records = history.raw.range(start, end)
+  else:
+    positions = _select(history.tier(name), columns(fields, resolution))
+    records = _tier_records(history, name, width, start, end)
+  return _rows(records, name, positions, len(fields), resolution)
+
+def _tier_records(history, name, width, start, end):
+  # the records of a tier from start to end, followed by the buckets it
+  # has not closed yet, e.g. the current hour of the 1h tier, rolled up
+  # from the samples the way the tier will be
+  ring = history.tier(name)
+  closed = -math.inf
+  if len(ring):
+    closed = ring[-1][0] + width
+  for record in ring.range(start, min(end, closed)):
+    yield record
+  first = max(closed, math.ceil(start / width) * width)
+  bucket = None
+  for t, values in history.raw.range(first, end):
+    bucket_start = t // width * width
+    if bucket is not None and bucket_start != bucket.start:
+      if bucket_start < bucket.start:
+        # the clock went back, as the tiers do these are left out
+        continue
+      yield bucket.start, bucket.values()
+      bucket = None
+    if bucket is None:
+      bucket = historylib.Bucket(bucket_start, len(values))
+    bucket.add(values)
+  if bucket is not None:
+    yield bucket.start, bucket.values()
+
+def _rows(records, name, positions, size, resolution):
+  if resolution is None:
+    for t, values in records:
+      values = [values[i] for i in positions]
+      if any(value == value for value in values):
+        yield t, values
+    return
+  bucket = None
+  for t, values in records:
+    bucket_start = t // resolution * resolution
+    if bucket is not None and bucket_start != bucket.start:
+      values_out = bucket.values()
+      if any(value == value for value in values_out):
+        yield bucket.start, values_out
+      bucket = None
+    if bucket is None:
+      if name == 'raw':
+        bucket = historylib.Bucket(bucket_start, size)
+      else:
+        bucket = _Merge(bucket_start, size)
+    bucket.add([values[i] for i in positions])
+  if bucket is not None:
+    values_out = bucket.values()
+    if any(value == value for value in values_out):
+      yield bucket.start, values_out
+
+def query(history, fields, start, end, resolution=None):
+  # the rows as a dict of NumPy arrays, 'time' and the columns, NaN for
+  # no value. Needs numpy, which is only imported here.
+  import numpy
+  names = ['time'] + columns(fields, resolution)
+  data = numpy.array([[t] + values for t, values in rows(history, fields, start, end, resolution)],
+                     dtype=numpy.float64).reshape(-1, len(names))
+  return dict((name, data[:, i]) for i, name in enumerate(names))
+
+def _value(value):
+  # NaN has no CSV or JSON form, it is left empty
+  if value != value:
+    return None
+  return value
+
+def write_csv(out, names, rows):
+  # a header line, then a line per row as it comes
+  writer = csv.writer(out)
+  writer.writerow(['time'] + names)
+  for t, values in rows:
+    writer.writerow([t] + ['' if value != value else value for value in values])
+
+def write_json_lines(out, names, rows):
+  # one JSON object per line, e.g. {"time":1792224000.0,"soil.moisture":42.5}
+  for t, values in rows:
+    row = {'time': t}
+    row.update(zip(names, map(_value, values)))
+    out.write(json.dumps(row, separators=(',', ':')) + '\n')
+
+WRITERS = {'csv': write_csv, 'json': write_json_lines}
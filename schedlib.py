@@ -0,0 +1,116 @@
+# Module for running the gardener's periodic jobs
+# asyncio scheduler where each source, display page and uplink runs as
+# its own periodic task with its own interval
+
+import asyncio
+import logging
+
+log = logging.getLogger('schedlib')
+
+class PeriodicTask(object):
+
+  def __init__(self, name, interval, fn, offset, blocking):
+    self.name = name
+    self.interval = interval
+    self.fn = fn
+    self.offset = offset
+    self.blocking = blocking
+    # completed runs, failed runs and ticks skipped because the previous
+    # run was still going
+    self.runs = 0
+    self.errors = 0
+    self.missed = 0
+    # seconds the last run took, and the latest any run started
+    self.last_duration = 0.0
+    self.max_lateness = 0.0
+
+  def stats(self):
+    return {'interval': self.interval, 'runs': self.runs, 'errors': self.errors,
+            'missed': self.missed, 'last_duration': self.last_duration,
+            'max_lateness': self.max_lateness}
+
+# Runs tasks on fixed grids of the loop's monotonic clock: a task with
+# interval 10 and offset 2 runs at 2, 12, 22... seconds after start,
+# however long each run takes, so the work time never adds up to drift.
+# A run that overruns its next tick skips the ticks it missed instead of
+# running them back to back.
+# Plain functions are blocking (sensor reads, I2C, network) and run in a
+# worker thread so they cannot stall the other tasks, coroutine
+# functions run on the loop itself.
+class Scheduler(object):
+
+  def __init__(self):
+    self.tasks = []
+    self._loop = None
+    self._stopped = None
+
+  def every(self, interval, fn, name=None, offset=0.0, blocking=None):
+    # run fn every interval seconds, first offset seconds after start
+    if interval <= 0:
+      raise ValueError('interval must be positive')
+    if blocking is None:
+      blocking = not asyncio.iscoroutinefunction(fn)
+    task = PeriodicTask(name or getattr(fn, '__name__', repr(fn)), interval, fn, offset, blocking)
+    self.tasks.append(task)
+    return task
+
+  def stats(self):
+    return dict((task.name, task.stats()) for task in self.tasks)
+
+  async def _run_task(self, task, start):
+    loop = self._loop
+    next_time = start + task.offset
+    while True:
+      delay = next_time - loop.time()
+      if delay > 0:
+        await asyncio.sleep(delay)
+      began = loop.time()
+      task.max_lateness = max(task.max_lateness, began - next_time)
+      try:
+        if task.blocking:
+          await loop.run_in_executor(None, task.fn)
+        else:
+          await task.fn()
+      except asyncio.CancelledError:
+        raise
+      except Exception:
+        task.errors += 1
+        log.exception('task %s failed', task.name)
+      else:
+        task.runs += 1
+      now = loop.time()
+      task.last_duration = now - began
+      # next tick on the task's grid, skipping those already passed
+      next_time += task.interval
+      if next_time < now:
+        skipped = int((now - next_time) // task.interval) + 1
+        task.missed += skipped
+        next_time += skipped * task.interval
+
+  async def run_async(self, duration=None):
+    # run the tasks until stop() is called or for duration seconds
+    self._loop = asyncio.get_event_loop()
+    self._stopped = asyncio.Event()
+    start = self._loop.time()
+    runners = [self._loop.create_task(self._run_task(task, start)) for task in self.tasks]
+    try:
+      if duration is None:
+        await self._stopped.wait()
+      else:
+        try:
+          await asyncio.wait_for(self._stopped.wait(), duration)
+        except asyncio.TimeoutError:
+          pass
+    finally:
+      for runner in runners:
+        runner.cancel()
+      await asyncio.gather(*runners, return_exceptions=True)
+
+  def run(self, duration=None):
+    # blocking version of run_async(), e.g. at the end of main()
+    asyncio.run(self.run_async(duration))
+
+  def stop(self):
+    # stop run(), may be called from any thread
+    if self._loop is not None:
+      self._loop.call_soon_threadsafe(self._stopped.set)
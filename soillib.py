@@ -0,0 +1,84 @@
+# Module for the soil moisture beds
+# Each bed is a moisture sensor on an analog input of the Arduino with
+# its own calibration and thresholds. Firmata reports the inputs as
+# 10-bit values, so the moisture and quality of every possible reading
+# are worked out once per bed and a scan of all the beds is a table
+# lookup per bed
+
+import acqlib
+
+# Firmata's analog inputs are 10 bits, reported as value / 1023
+ANALOG_MAX = 1023
+
+# A soil moisture bed: the Arduino analog pin, the name its values go by
+# ('soil' -> soil.moisture), the sensor's readings in dry sand and in
+# mud, the moisture percentages below which it is dry and from which it
+# is mud, and how often it is read in seconds (None for the default of
+# scan_sources())
+class SoilChannel(object):
+
+  def __init__(self, pin, name, sand=0.51, mud=0.26, dry=40, wet=80, interval=None):
+    self.pin = pin
+    self.name = name
+    self.sand = sand
+    self.mud = mud
+    self.dry = dry
+    self.wet = wet
+    self.interval = interval
+
+  def table(self):
+    # (moisture, quality) of each 10-bit reading, computed from the
+    # reading exactly as Firmata reports it
+    table = []
+    for code in range(ANALOG_MAX + 1):
+      smp = acqlib.soil_moisture_percent(round(code / ANALOG_MAX, 4), self.sand, self.mud)
+      table.append((smp, acqlib.soil_quality(smp, self.dry, self.wet)))
+    return table
+
+# Reads every bed once per tick. pins are the Arduino's analog pins (see
+# acqlib.init_firmata) in the order of channels. Each bed's raw reading,
+# moisture and quality become a sample under the bed's name; a bed whose
+# pin has not reported yet is left out of that tick.
+class SoilScanSource(acqlib.Source):
+
+  def __init__(self, channels, pins, interval=10, name='soil'):
+    acqlib.Source.__init__(self, name, interval)
+    if len(channels) != len(pins):
+      raise ValueError('one pin is needed per soil channel')
+    self.channels = channels
+    self.pins = pins
+    # the tables are built once, here, whatever the number of beds
+    self.tables = [channel.table() for channel in channels]
+    self._names = [channel.name for channel in channels]
+
+  def read_channels(self):
+    values = {}
+    for name, pin, table in zip(self._names, self.pins, self.tables):
+      sm = pin.read()
+      if sm is None:
+        # no value reported by the Arduino yet
+        continue
+      smp, quality = table[int(sm * ANALOG_MAX + 0.5)]
+      values[name] = {'raw': sm, 'moisture': smp, 'quality': quality}
+    return values
+
+# One SoilScanSource per interval of the channels, so each bed keeps its
+# own interval while the beds that share one are read in the same scan.
+# The first is named name, the others name_<interval>, e.g. soil_60.
+def scan_sources(channels, pins, interval=10, name='soil'):
+  groups = []
+  for channel, pin in zip(channels, pins):
+    channel_interval = interval if channel.interval is None else channel.interval
+    for group_interval, group_channels, group_pins in groups:
+      if group_interval == channel_interval:
+        break
+    else:
+      group_channels, group_pins = [], []
+      groups.append((channel_interval, group_channels, group_pins))
+    group_channels.append(channel)
+    group_pins.append(pin)
+  sources = []
+  for group_interval, group_channels, group_pins in groups:
+    group_name = name if not sources else '{0}_{1:g}'.format(name, group_interval)
+    sources.append(SoilScanSource(group_channels, group_pins, group_interval, group_name))
+  return sources
@@ -0,0 +1,213 @@
+# Module for store-and-forward of uplink messages
+# Messages are written to an SQLite database in WAL mode before they are
+# sent, and only removed once the broker has confirmed them, so readings
+# taken while the broker is unreachable (or the Pi restarts) are sent
+# when the connection is back instead of being lost
+
+import logging
+import sqlite3
+import threading
+import time
+
+import acqlib
+
+log = logging.getLogger('spoollib')
+
+# what to do when the spool is full
+DROP_OLDEST = 'drop_oldest'   # evict the oldest messages, keep the latest
+DROP_NEWEST = 'drop_newest'   # refuse new messages, keep the backlog
+
+# A bounded on-disk FIFO of MQTT messages. Every put() is its own
+# transaction, so a message that put() returned for survives a crash.
+# Bounded by message count and by payload bytes, the policy says which
+# end gives way when a bound is hit.
+class Spool(object):
+
+  def __init__(self, path, max_messages=100000, max_bytes=None,
+               policy=DROP_OLDEST, synchronous='NORMAL'):
+    if policy not in (DROP_OLDEST, DROP_NEWEST):
+      raise ValueError('policy must be DROP_OLDEST or DROP_NEWEST')
+    self.path = path
+    self.max_messages = max_messages
+    self.max_bytes = max_bytes
+    self.policy = policy
+    self._lock = threading.Lock()
+    self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+    self._db.execute('PRAGMA journal_mode=WAL')
+    # NORMAL survives the program crashing, FULL also survives a power
+    # cut at the cost of an fsync per message
+    self._db.execute('PRAGMA synchronous=' + synchronous)
+    self._db.execute('CREATE TABLE IF NOT EXISTS messages ('
+                     'id INTEGER PRIMARY KEY AUTOINCREMENT, time REAL NOT NULL, '
+                     'topic TEXT NOT NULL, payload BLOB NOT NULL, '
+                     'qos INTEGER NOT NULL, retain INTEGER NOT NULL)')
+    count, size = self._db.execute('SELECT COUNT(*), TOTAL(LENGTH(payload)) FROM messages').fetchone()
+    self._count = count
+    self._bytes = int(size)
+    # messages dropped to stay within the bounds
+    self.evicted = 0
+    self.rejected = 0
+
+  def __len__(self):
+    return self._count
+
+  def size(self):
+    # payload bytes held
+    return self._bytes
+
+  def stats(self):
+    with self._lock:
+      return {'messages': self._count, 'bytes': self._bytes,
+              'evicted': self.evicted, 'rejected': self.rejected}
+
+  def close(self):
+    with self._lock:
+      self._db.close()
+
+  def _full(self, extra_messages, extra_bytes):
+    if self.max_messages is not None and self._count + extra_messages > self.max_messages:
+      return True
+    return self.max_bytes is not None and self._bytes + extra_bytes > self.max_bytes
+
+  def put(self, topic, payload, qos=0, retain=False):
+    # append a message, returns False if the policy refused it
+    size = len(payload)
+    with self._lock:
+      db = self._db
+      if self.max_bytes is not None and size > self.max_bytes:
+        # would never fit
+        self.rejected += 1
+        return False
+      if self._full(1, size):
+        if self.policy == DROP_NEWEST:
+          self.rejected += 1
+          return False
+      db.execute('BEGIN IMMEDIATE')
+      try:
+        while self._count and self._full(1, size):
+          # evict the oldest messages, a batch at a time
+          rows = db.execute('SELECT id, LENGTH(payload) FROM messages ORDER BY id LIMIT 64').fetchall()
+          last = None
+          for id, length in rows:
+            if not self._full(1, size):
+              break
+            last = id
+            self._count -= 1
+            self._bytes -= length
+            self.evicted += 1
+          db.execute('DELETE FROM messages WHERE id <= ?', (last,))
+        db.execute('INSERT INTO messages (time, topic, payload, qos, retain) VALUES (?, ?, ?, ?, ?)',
+                   (time.time(), topic, payload, qos, int(retain)))
+        db.execute('COMMIT')
+      except Exception:
+        db.execute('ROLLBACK')
+        # recount, the eviction above was rolled back
+        count, size = db.execute('SELECT COUNT(*), TOTAL(LENGTH(payload)) FROM messages').fetchone()
+        self._count = count
+        self._bytes = int(size)
+        raise
+      self._count += 1
+      self._bytes += size
+    return True
+
+  def peek(self, limit):
+    # the oldest limit messages as (id, topic, payload, qos, retain)
+    with self._lock:
+      rows = self._db.execute('SELECT id, topic, payload, qos, retain FROM messages '
+                              'ORDER BY id LIMIT ?', (limit,)).fetchall()
+    return [(id, topic, payload, qos, bool(retain)) for id, topic, payload, qos, retain in rows]
+
+  def ack(self, last_id):
+    # remove every message up to and including last_id
+    with self._lock:
+      db = self._db
+      count, size = db.execute('SELECT COUNT(*), TOTAL(LENGTH(payload)) FROM messages '
+                               'WHERE id <= ?', (last_id,)).fetchone()
+      db.execute('DELETE FROM messages WHERE id <= ?', (last_id,))
+      self._count -= count
+      self._bytes -= int(size)
+
+# Stands in for an MQTT client: publish() puts the message in a spool
+# instead of sending it, e.g. as the client of a BatchMQTTSink
+class SpoolingClient(object):
+
+  def __init__(self, spool):
+    self.spool = spool
+
+  def publish(self, topic, payload=None, qos=0, retain=False):
+    # like paho, no payload sends an empty message
+    if payload is None:
+      payload = b''
+    return self.spool.put(topic, payload, qos, retain)
+
+# Sends the spooled messages every interval seconds while the uplink is
+# connected, oldest first and up to batch per tick. publish(topic,
+# payload, qos, retain) hands a message to the MQTT client and returns
+# its mid, or None when the client refused it; connected() tells whether
+# it is worth trying. on_publish is the client's paho on_publish
+# callback. Messages go out with at least qos, so that callback means the
+# broker has them, and they are removed from the spool only once it came,
+# up to timeout seconds after the batch was sent. A message the client
+# dropped in an outage is still spooled and is sent again, the broker may
+# then get it twice but never not at all.
+class ForwardSink(acqlib.Sink):
+
+  def __init__(self, spool, publish, connected, interval=5, batch=500, qos=1,
+               timeout=10, name='forward'):
+    acqlib.Sink.__init__(self, name, interval, offset=0)
+    self.spool = spool
+    self.publish = publish
+    self.connected = connected
+    self.batch = batch
+    self.qos = qos
+    self.timeout = timeout
+    self.forwarded = 0
+    # mids the broker confirmed, of the batch being sent
+    self._delivered = set()
+    self._confirmed = threading.Condition()
+
+  def stats(self):
+    stats = acqlib.Sink.stats(self)
+    stats.update(self.spool.stats())
+    stats['forwarded'] = self.forwarded
+    return stats
+
+  def on_publish(self, client, userdata, mid):
+    with self._confirmed:
+      self._delivered.add(mid)
+      self._confirmed.notify_all()
+
+  def _wait(self, mids):
+    # how many of mids, in order, the broker confirmed by the timeout
+    deadline = time.monotonic() + self.timeout
+    sent = 0
+    with self._confirmed:
+      for mid in mids:
+        while mid not in self._delivered:
+          remaining = deadline - time.monotonic()
+          if remaining <= 0:
+            return sent
+          self._confirmed.wait(remaining)
+        sent += 1
+    return sent
+
+  def tick(self):
+    while len(self.spool) and self.connected():
+      messages = self.spool.peek(self.batch)
+      with self._confirmed:
+        # confirmations of an earlier batch that came too late
+        self._delivered.clear()
+      mids = []
+      for id, topic, payload, qos, retain in messages:
+        mid = self.publish(topic, payload, max(qos, self.qos), retain)
+        if mid is None:
+          break
+        mids.append(mid)
+      sent = self._wait(mids)
+      if not sent:
+        return
+      self.spool.ack(messages[sent-1][0])
+      self.forwarded += sent
+      if sent < len(messages):
+        # the uplink stopped taking messages, try again next tick
+        return
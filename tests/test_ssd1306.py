@@ -0,0 +1,62 @@
+import unittest
+
+from Adafruit_SSD1306 import SSD1306_128_32
+from Adafruit_SSD1306.virtual import virtual_display
+
+
+def _frame(disp, byte):
+    # a screen buffer with every page byte set to byte
+    return bytearray([byte])*(disp.width*disp.height//8)
+
+
+class ShowScreenTest(unittest.TestCase):
+
+    def setUp(self):
+        self.disp, self.device = virtual_display(SSD1306_128_32)
+        self.disp.begin()
+
+    def lit(self):
+        # pixels lit on the panel
+        return sum(sum(row) for row in self.device.frame())
+
+    def test_display_writes_the_screen_shown(self):
+        disp = self.disp
+        disp.load_screens([_frame(disp, 0x00), _frame(disp, 0x00)])
+        disp.show_screen(1)
+        disp.set_pixel(3, 5)
+        disp.display()
+        self.assertEqual(self.lit(), 1)
+        self.assertEqual(self.device.frame()[5][3], 1)
+        # screen 0 is untouched
+        disp.show_screen(0)
+        self.assertEqual(self.lit(), 0)
+
+    def test_show_screen_loads_the_buffer(self):
+        disp = self.disp
+        disp.load_screens([_frame(disp, 0x00), _frame(disp, 0xFF)])
+        disp.show_screen(1)
+        self.assertEqual(disp._buffer, _frame(disp, 0xFF))
+        # nothing changed, nothing to send
+        self.device.reset_counters()
+        disp.display()
+        self.assertEqual(self.device.stats()['data_bytes'], 0)
+        disp.clear()
+        disp.display()
+        self.assertEqual(self.lit(), 0)
+        disp.show_screen(0)
+        disp.show_screen(1)
+        self.assertEqual(self.lit(), 0)
+
+    def test_screen_not_loaded_is_written_in_full(self):
+        disp = self.disp
+        disp.load_screens([_frame(disp, 0x00)])
+        disp.show_screen(1)
+        self.device.reset_counters()
+        disp.set_pixel(0, 0)
+        disp.display()
+        self.assertEqual(self.device.stats()['data_bytes'], len(_frame(disp, 0)))
+        self.assertEqual(self.lit(), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()